@@ -1,18 +1,20 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
 import os
 import sys
 import json
 import uuid
 import tempfile
-import shutil
 from typing import Optional, List, Dict
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
-from pathlib import Path
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Determine base directory (handles both local dev and Docker)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -27,6 +29,17 @@ os.chdir(BASE_DIR)
 sys.path.insert(0, BASE_DIR)
 import create_map_poster as cmp
 
+# Backend helper modules live next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from scheduler import JobScheduler, AdmissionError, estimate_job_cost, estimate_bundle_cost
+from job_estimator import JobEstimator
+from storage import OutputStore
+from models import PosterRequest, BundleRequest
+from memory import degrade_request, DEGRADE_STEPS, DPI_DEGRADE_STEPS
+from prewarm import Prewarmer, request_fingerprint
+import deepzoom
+import render_worker
+
 app = FastAPI(title="Map Poster Generator API", version="1.0.0")
 
 # CORS middleware
@@ -38,59 +51,125 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Use temporary directory for posters with auto-cleanup
-TEMP_POSTERS_DIR = tempfile.mkdtemp(prefix="maptoposter_")
-print(f"📁 Temporary posters directory: {TEMP_POSTERS_DIR}")
+# Temporary directory for posters with auto-cleanup, created on startup
+TEMP_POSTERS_DIR = None
 
 # In-memory job storage (in production, use Redis or a database)
 jobs = {}
 
 # File cleanup configuration
 FILE_EXPIRY_HOURS = 2  # Delete files older than 2 hours
+CLEANUP_INTERVAL_SECONDS = 300  # Expiry checks only touch expired files, so run them often
+
+# Outputs never change once written, so browsers may cache them indefinitely
+OUTPUT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STREAM_CHUNK_SIZE = 256 * 1024
+
+output_store = None  # OutputStore over TEMP_POSTERS_DIR, created on startup
+
+# Scheduling configuration (see scheduler.py for how job cost is computed)
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", "2"))
+MAX_CONCURRENT_HEAVY_JOBS = int(os.environ.get("MAX_CONCURRENT_HEAVY_JOBS", "1"))
+HEAVY_JOB_COST = float(os.environ.get("HEAVY_JOB_COST", "16.0"))  # Jobs at or above this cost use the heavy lane
+MAX_JOB_COST = float(os.environ.get("MAX_JOB_COST", "40.0"))  # Jobs above this cost are rejected
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", "50"))
+HEAVY_JOB_MAX_WAIT = int(os.environ.get("HEAVY_JOB_MAX_WAIT", "600"))  # Seconds before a heavy job is promoted
+
+# Render worker pool: long-lived processes with modules, fonts and themes preloaded
+RENDER_WORKER_MAX_JOBS = int(os.environ.get("RENDER_WORKER_MAX_JOBS", "20"))  # Recycle a worker after this many jobs
+
+# Per-job memory budget (0 disables it). Over-budget requests are degraded to a
+# lower DPI / fewer layers, or rejected with MEMORY_BUDGET_POLICY=fail
+JOB_MEMORY_BUDGET_MB = int(os.environ.get("JOB_MEMORY_BUDGET_MB", "4096"))
+MEMORY_BUDGET_POLICY = os.environ.get("MEMORY_BUDGET_POLICY", "degrade")
+
+# Export bundles: one fetch, several output sizes
+BUNDLE_MAX_VARIANTS = 8
+BUNDLE_RENDER_PROCESSES = int(os.environ.get("BUNDLE_RENDER_PROCESSES", "4"))
+
+# Layered rendering: large PNG posters rasterise each map layer in its own
+# process and alpha-composite the results (0 disables it)
+LAYER_RENDER_PROCESSES = int(os.environ.get("LAYER_RENDER_PROCESSES", "0"))
+
+# Drawing backend for PNG-only posters: "matplotlib" (reference) or "raster"
+# (draws straight into an Agg buffer, faster for dense maps). SVG output
+# always uses matplotlib
+RENDER_BACKEND = os.environ.get("RENDER_BACKEND", "matplotlib")
+
+# Idle-time prewarming: geocode and fetch the most requested locations while
+# no jobs are running. Off by default (PREWARM_TOP_N=0): it sends background
+# traffic to Nominatim and Overpass, so enable it only for a mirror of your own
+# (see configure_upstreams). PREWARM_RENDER_TOP also renders the most requested
+# preview posters ahead of time
+PREWARM_TOP_N = int(os.environ.get("PREWARM_TOP_N", "0"))
+PREWARM_INTERVAL_SECONDS = int(os.environ.get("PREWARM_INTERVAL_SECONDS", "30"))
+PREWARM_REWARM_HOURS = float(os.environ.get("PREWARM_REWARM_HOURS", "12"))
+PREWARM_RENDER_TOP = int(os.environ.get("PREWARM_RENDER_TOP", "0"))
+
+# Deadlines: a job may run JOB_TIMEOUT_SECONDS in total (0 for no limit), each
+# stage as long as render_worker.DEFAULT_STAGE_TIMEOUTS allows, overridable
+# with e.g. STAGE_TIMEOUTS="graph=300,fetch=600"
+JOB_TIMEOUT_SECONDS = int(os.environ.get("JOB_TIMEOUT_SECONDS", "1800"))
+STAGE_TIMEOUTS = os.environ.get("STAGE_TIMEOUTS", "")
+
+# Queued and running jobs whose status nobody has checked for this many
+# seconds are cancelled, so capacity isn't spent on posters nobody will
+# collect (0 disables reaping). The web UI polls every 2 seconds
+ABANDONED_JOB_SECONDS = int(os.environ.get("ABANDONED_JOB_SECONDS", "120"))
+REAP_INTERVAL_SECONDS = 15
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "zip": "application/zip",
+    "webp": "image/webp",
+    "dzi": "application/xml",
+}
+
+# Historical run metrics used to predict job duration, memory and output size
+JOB_METRICS_FILE = os.environ.get("JOB_METRICS_FILE", os.path.join(BASE_DIR, "metrics", "job_metrics.jsonl"))
+estimator = None  # JobEstimator over JOB_METRICS_FILE, loaded on startup
+
+def parse_stage_timeouts(text: str):
+    """Parse 'graph=300,fetch=600' into {stage: seconds}."""
+    timeouts = {}
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        stage, _, seconds = part.partition('=')
+        if stage.strip() not in render_worker.DEFAULT_STAGE_TIMEOUTS:
+            raise ValueError(f"Unknown stage '{stage}' in STAGE_TIMEOUTS. "
+                             f"Stages: {', '.join(render_worker.DEFAULT_STAGE_TIMEOUTS)}")
+        timeouts[stage.strip()] = float(seconds)
+    return timeouts
 
 def cleanup_old_files():
     """Remove poster files older than FILE_EXPIRY_HOURS."""
     try:
-        now = datetime.now()
-        count = 0
-        for file_path in Path(TEMP_POSTERS_DIR).glob("*.png"):
-            file_age = now - datetime.fromtimestamp(file_path.stat().st_mtime)
-            if file_age > timedelta(hours=FILE_EXPIRY_HOURS):
-                file_path.unlink()
-                count += 1
+        count = output_store.expire()
         if count > 0:
             print(f"🧹 Cleaned up {count} old poster files")
     except Exception as e:
         print(f"Error during cleanup: {e}")
 
-class PosterRequest(BaseModel):
-    city: str
-    country: str
-    theme: str = "feature_based"
-    distance: int = 29000
-
-    # Output configuration
-    width: int = 12
-    height: int = 16
-    dpi: int = 300
-    format: str = "png"  # png, svg, or both
-
-    # Feature toggles
-    show_water: bool = True
-    show_parks: bool = True
-    show_buildings: bool = False
-    show_railways: bool = False
-    show_attribution: bool = True
-
-    # Custom colors (optional overrides)
-    custom_colors: Optional[Dict[str, str]] = None
-
 class JobStatus(BaseModel):
     job_id: str
-    status: str  # queued, processing, completed, failed
+    status: str  # queued, processing, completed, failed, cancelled
     message: str
     file_url: Optional[str] = None
     progress: int = 0
+    lane: Optional[str] = None  # interactive or heavy
+    queue_position: Optional[int] = None
+    variants: Optional[List[Dict]] = None  # Per-variant download links for bundles
+    memory: Optional[Dict] = None  # Peak memory in MB per stage and for the whole job
+    adjustments: Optional[List[str]] = None  # Degradations applied to fit the memory budget
+    tiles: Optional[Dict] = None  # Deep-zoom tile pyramid: descriptor URL, image and tile size
+
+class JobEstimate(BaseModel):
+    duration_seconds: float
+    peak_memory_mb: float
+    output_size_mb: float
+    samples: int  # Number of past jobs the prediction is based on
+    cost: float
+    lane: str
 
 class ThemeInfo(BaseModel):
     name: str
@@ -163,6 +242,22 @@ async def get_presets():
             {"value": "svg", "name": "SVG", "description": "Vector image, scalable to any size"},
             {"value": "both", "name": "Both", "description": "PNG + SVG (two files)"},
         ],
+        "bundle_presets": [
+            {"name": "Social Pack", "variants": [
+                {"name": "instagram_post", "width": 12, "height": 12, "dpi": 150, "format": "png"},
+                {"name": "instagram_story", "width": 9, "height": 16, "dpi": 150, "format": "png"},
+                {"name": "phone_wallpaper", "width": 9, "height": 16, "dpi": 300, "format": "png"},
+            ]},
+            {"name": "Social + Print", "variants": [
+                {"name": "instagram_post", "width": 12, "height": 12, "dpi": 150, "format": "png"},
+                {"name": "instagram_story", "width": 9, "height": 16, "dpi": 150, "format": "png"},
+                {"name": "print_18x24", "width": 18, "height": 24, "dpi": 300, "format": "png"},
+            ]},
+            {"name": "Screens", "variants": [
+                {"name": "desktop_wallpaper", "width": 16, "height": 9, "dpi": 300, "format": "png"},
+                {"name": "phone_wallpaper", "width": 9, "height": 16, "dpi": 300, "format": "png"},
+            ]},
+        ],
         "dpi_options": [
             {"name": "Preview (150 DPI)", "value": 150, "description": "Fast, good for previews"},
             {"name": "Standard (300 DPI)", "value": 300, "description": "High quality, recommended"},
@@ -177,8 +272,51 @@ async def get_presets():
     }
 
 @app.post("/api/generate", response_model=JobStatus)
-async def generate_poster(request: PosterRequest, background_tasks: BackgroundTasks):
+async def generate_poster(request: PosterRequest):
     """Generate a map poster. Returns a job ID to track progress."""
+    _validate_location(request)
+    _validate_output(request.width, request.height, request.dpi, request.format)
+    if request.tiles and request.format == "svg":
+        raise HTTPException(status_code=400, detail="Tiles are cut from the PNG; use format 'png' or 'both'")
+    data, adjustments = _fit_memory_budget(request.dict())
+    request = PosterRequest(**data)
+    return _submit_job(request, estimate_job_cost(request), adjustments)
+
+@app.post("/api/bundle", response_model=JobStatus)
+async def generate_bundle(request: BundleRequest):
+    """
+    Generate several output sizes/formats of the same map from a single fetch.
+    The finished bundle downloads as a zip; each variant is also available on its own.
+    """
+    _validate_location(request)
+
+    if not request.variants:
+        raise HTTPException(status_code=400, detail="At least one variant is required")
+    if len(request.variants) > BUNDLE_MAX_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"A bundle can have at most {BUNDLE_MAX_VARIANTS} variants")
+    if request.tiles:
+        raise HTTPException(status_code=400, detail="Tiles are not available for bundles")
+
+    names = [variant.name for variant in request.variants]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Variant names must be unique")
+
+    for variant in request.variants:
+        _validate_output(variant.width, variant.height, variant.dpi, variant.format)
+
+    # Each variant is rendered separately, so each must fit the memory budget
+    base = request.dict(exclude={"variants"})
+    variants = []
+    adjustments = []
+    for variant in request.variants:
+        data, notes = _fit_memory_budget(dict(base, **variant.dict()), DPI_DEGRADE_STEPS)
+        variants.append(variant.copy(update={"dpi": data["dpi"]}))
+        adjustments.extend(f"{variant.name}: {note}" for note in notes)
+    request = request.copy(update={"variants": variants})
+
+    return _submit_job(request, estimate_bundle_cost(request), adjustments)
+
+def _validate_location(request: PosterRequest):
     # Validate theme
     available_themes = cmp.get_available_themes()
     if request.theme not in available_themes:
@@ -188,218 +326,334 @@ async def generate_poster(request: PosterRequest, background_tasks: BackgroundTa
     if request.distance < 1000 or request.distance > 50000:
         raise HTTPException(status_code=400, detail="Distance must be between 1000 and 50000 meters")
 
+def _validate_output(width: int, height: int, dpi: int, fmt: str):
     # Validate dimensions
-    if request.width < 6 or request.width > 48:
+    if width < 6 or width > 48:
         raise HTTPException(status_code=400, detail="Width must be between 6 and 48 inches")
 
-    if request.height < 6 or request.height > 48:
+    if height < 6 or height > 48:
         raise HTTPException(status_code=400, detail="Height must be between 6 and 48 inches")
 
     # Validate DPI
-    if request.dpi not in [150, 300, 600]:
+    if dpi not in [150, 300, 600]:
         raise HTTPException(status_code=400, detail="DPI must be 150, 300, or 600")
 
     # Validate format
-    if request.format not in ["png", "svg", "both"]:
+    if fmt not in ["png", "svg", "both"]:
         raise HTTPException(status_code=400, detail="Format must be 'png', 'svg', or 'both'")
 
-    # Create job
+def _fit_memory_budget(data: dict, steps=DEGRADE_STEPS):
+    """
+    Check a request's predicted peak memory against JOB_MEMORY_BUDGET_MB.
+    Over-budget requests are degraded step by step, or rejected under the
+    "fail" policy. Returns the (possibly degraded) request dict and the list
+    of adjustments made.
+    """
+    if not JOB_MEMORY_BUDGET_MB:
+        return data, []
+
+    def predict_peak_mb(candidate):
+        return estimator.predict(candidate)["peak_memory_mb"]
+
+    if MEMORY_BUDGET_POLICY == "fail":
+        steps = []
+    fitted, adjustments = degrade_request(data, predict_peak_mb, JOB_MEMORY_BUDGET_MB, steps)
+    if fitted is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Request needs ~{predict_peak_mb(data):,.0f} MB of memory, over the "
+                   f"{JOB_MEMORY_BUDGET_MB:,} MB budget. Reduce the DPI, poster size or layers."
+        )
+    return fitted, adjustments
+
+def _submit_job(request: PosterRequest, cost: float, adjustments: Optional[List[str]] = None):
+    """Admission control: reject over-budget jobs, route the rest to a lane."""
     job_id = str(uuid.uuid4())
+    if prewarmer is not None:
+        # Real work takes priority over any warm-up in progress
+        prewarmer.interrupt()
+        prewarmer.note_request(request.dict())
+        prerendered = _take_prerendered(job_id, request)
+        if prerendered:
+            return prerendered
+
+    try:
+        lane = scheduler.submit(job_id, request, cost)
+    except AdmissionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
     jobs[job_id] = {
         "status": "queued",
         "message": "Job queued for processing",
         "progress": 0,
-        "request": request.dict()
+        "request": request.dict(),
+        "cost": cost,
+        "lane": lane,
+        "adjustments": adjustments or [],
+        "last_seen": time.monotonic(),
     }
 
-    # Add background task
-    background_tasks.add_task(process_poster_generation, job_id, request)
-
     return JobStatus(
         job_id=job_id,
         status="queued",
         message="Job queued for processing",
-        progress=0
+        progress=0,
+        lane=lane,
+        queue_position=scheduler.position(job_id),
+        adjustments=adjustments or None
+    )
+
+@app.post("/api/estimate", response_model=JobEstimate)
+async def estimate_poster(request: PosterRequest):
+    """Predict duration, peak memory and output size of a request before submitting it."""
+    prediction = estimator.predict(request)
+    cost = estimate_job_cost(request)
+    return JobEstimate(**prediction, cost=cost, lane=scheduler.classify(cost))
+
+# Created on startup; see render_worker.py and prewarm.py
+render_pool = None
+progress_queue = None
+prewarm_stop = None
+prewarmer = None
+prerendered = {}  # request fingerprint -> run_job result of a pre-rendered preview
+cancelled_jobs = None  # Shared with workers: job id -> reason, for jobs to stop at their next checkpoint
+
+def _create_render_pool():
+    """Start a pool of spawned render workers that recycle after RENDER_WORKER_MAX_JOBS jobs."""
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(
+        max_workers=MAX_CONCURRENT_JOBS,
+        mp_context=context,
+        initializer=render_worker.init_worker,
+        initargs=(progress_queue, TEMP_POSTERS_DIR, BUNDLE_RENDER_PROCESSES,
+                  JOB_MEMORY_BUDGET_MB, MEMORY_BUDGET_POLICY, LAYER_RENDER_PROCESSES, prewarm_stop,
+                  RENDER_BACKEND, cancelled_jobs, JOB_TIMEOUT_SECONDS, parse_stage_timeouts(STAGE_TIMEOUTS)),
+        max_tasks_per_child=RENDER_WORKER_MAX_JOBS,
     )
 
-def _generate_poster_sync(job_id: str, request: PosterRequest):
-    """Synchronous poster generation function to run in thread pool."""
-    import matplotlib.pyplot as plt
-    from matplotlib.font_manager import FontProperties
-    import osmnx as ox
-    import time
+async def _run_in_render_pool(fn, *args):
+    """
+    Run fn(*args) in a render worker. A pool whose worker died (e.g. killed
+    for memory) cannot be reused and fails every task it holds; only the first
+    of them to notice replaces it, so a crash starts exactly one new pool.
+    """
+    global render_pool
 
+    pool = render_pool
     try:
-        jobs[job_id]["status"] = "processing"
-        jobs[job_id]["message"] = "Geocoding location..."
-        jobs[job_id]["progress"] = 10
-
-        # Load theme
-        cmp.THEME = cmp.load_theme(request.theme)
-
-        # Apply custom color overrides
-        if request.custom_colors:
-            cmp.THEME.update(request.custom_colors)
-
-        # Get coordinates
-        coords = cmp.get_coordinates(request.city, request.country)
-        jobs[job_id]["progress"] = 15
-        jobs[job_id]["message"] = "Downloading street network..."
-
-        # Fetch street network
-        G = ox.graph_from_point(coords, dist=request.distance, dist_type='bbox', network_type='all')
-        jobs[job_id]["progress"] = 35
-        time.sleep(0.3)
-
-        # Fetch optional features based on toggles
-        water = None
-        parks = None
-        buildings = None
-        railways = None
-
-        if request.show_water:
-            try:
-                jobs[job_id]["message"] = "Downloading water features..."
-                water = ox.features_from_point(coords, tags={'natural': 'water', 'waterway': 'riverbank'}, dist=request.distance)
-                jobs[job_id]["progress"] = 45
-            except:
-                pass
-            time.sleep(0.3)
-
-        if request.show_parks:
-            try:
-                jobs[job_id]["message"] = "Downloading parks..."
-                parks = ox.features_from_point(coords, tags={'leisure': 'park', 'landuse': 'grass'}, dist=request.distance)
-                jobs[job_id]["progress"] = 50
-            except:
-                pass
-            time.sleep(0.3)
-
-        if request.show_buildings:
-            try:
-                jobs[job_id]["message"] = "Downloading buildings..."
-                buildings = ox.features_from_point(coords, tags={'building': True}, dist=request.distance)
-                jobs[job_id]["progress"] = 55
-            except:
-                pass
-            time.sleep(0.3)
-
-        if request.show_railways:
-            try:
-                jobs[job_id]["message"] = "Downloading railways..."
-                railways = ox.features_from_point(coords, tags={'railway': 'rail'}, dist=request.distance)
-                jobs[job_id]["progress"] = 60
-            except:
-                pass
-
-        jobs[job_id]["progress"] = 80
-        jobs[job_id]["message"] = "Rendering map..."
-
-        # Setup plot with custom dimensions
-        fig, ax = plt.subplots(figsize=(request.width, request.height), facecolor=cmp.THEME['bg'])
-        ax.set_facecolor(cmp.THEME['bg'])
-        ax.set_position([0, 0, 1, 1])
-
-        # Plot layers (filter to polygon geometries only to avoid blue dots from point features)
-        if water is not None and not water.empty:
-            water = water[water.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-            if not water.empty:
-                water.plot(ax=ax, facecolor=cmp.THEME['water'], edgecolor='none', zorder=1)
-
-        if parks is not None and not parks.empty:
-            parks = parks[parks.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-            if not parks.empty:
-                parks.plot(ax=ax, facecolor=cmp.THEME['parks'], edgecolor='none', zorder=2)
-
-        if buildings is not None and not buildings.empty:
-            buildings = buildings[buildings.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-            if not buildings.empty:
-                building_color = cmp.THEME.get('building', '#D0D0D0')
-                buildings.plot(ax=ax, facecolor=building_color, edgecolor='none', alpha=0.5, zorder=2.5)
-
-        if railways is not None and not railways.empty:
-            railway_color = cmp.THEME.get('railway', '#888888')
-            railways.plot(ax=ax, color=railway_color, linewidth=0.5, zorder=2.7)
-
-        # Roads
-        edge_colors = cmp.get_edge_colors_by_type(G)
-        edge_widths = cmp.get_edge_widths_by_type(G)
-        ox.plot_graph(G, ax=ax, bgcolor=cmp.THEME['bg'], node_size=0, edge_color=edge_colors, edge_linewidth=edge_widths, show=False, close=False)
-
-        jobs[job_id]["progress"] = 80
-
-        # Gradients
-        cmp.create_gradient_fade(ax, cmp.THEME['gradient_color'], location='bottom', zorder=10)
-        cmp.create_gradient_fade(ax, cmp.THEME['gradient_color'], location='top', zorder=10)
-
-        # Typography
-        if cmp.FONTS:
-            font_main = FontProperties(fname=cmp.FONTS['bold'], size=60)
-            font_sub = FontProperties(fname=cmp.FONTS['light'], size=22)
-            font_coords = FontProperties(fname=cmp.FONTS['regular'], size=14)
-            font_attr = FontProperties(fname=cmp.FONTS['light'], size=8)
-        else:
-            font_main = FontProperties(family='monospace', weight='bold', size=60)
-            font_sub = FontProperties(family='monospace', weight='normal', size=22)
-            font_coords = FontProperties(family='monospace', size=14)
-            font_attr = FontProperties(family='monospace', size=8)
-
-        spaced_city = "  ".join(list(request.city.upper()))
-        ax.text(0.5, 0.14, spaced_city, transform=ax.transAxes, color=cmp.THEME['text'], ha='center', fontproperties=font_main, zorder=11)
-        ax.text(0.5, 0.10, request.country.upper(), transform=ax.transAxes, color=cmp.THEME['text'], ha='center', fontproperties=font_sub, zorder=11)
-
-        lat, lon = coords
-        coords_text = f"{lat:.4f}° N / {lon:.4f}° E" if lat >= 0 else f"{abs(lat):.4f}° S / {lon:.4f}° E"
-        if lon < 0:
-            coords_text = coords_text.replace("E", "W")
-        ax.text(0.5, 0.07, coords_text, transform=ax.transAxes, color=cmp.THEME['text'], alpha=0.7, ha='center', fontproperties=font_coords, zorder=11)
-        ax.plot([0.4, 0.6], [0.125, 0.125], transform=ax.transAxes, color=cmp.THEME['text'], linewidth=1, zorder=11)
-        
-        if request.show_attribution:
-            ax.text(0.98, 0.02, "powered by arun.im", transform=ax.transAxes, color=cmp.THEME['text'], alpha=0.4, ha='right', va='bottom', fontproperties=font_attr, zorder=11)
-
-        jobs[job_id]["progress"] = 90
-        jobs[job_id]["message"] = "Saving poster..."
-
-        # Generate output filename(s)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        city_slug = request.city.lower().replace(' ', '_')
-        base_filename = f"{city_slug}_{request.theme}_{timestamp}"
-
-        output_files = []
-
-        # Save based on format request
-        if request.format in ["png", "both"]:
-            png_file = os.path.join(TEMP_POSTERS_DIR, f"{base_filename}.png")
-            plt.savefig(png_file, dpi=request.dpi, facecolor=cmp.THEME['bg'], format='png')
-            output_files.append(png_file)
-
-        if request.format in ["svg", "both"]:
-            svg_file = os.path.join(TEMP_POSTERS_DIR, f"{base_filename}.svg")
-            plt.savefig(svg_file, facecolor=cmp.THEME['bg'], format='svg')
-            output_files.append(svg_file)
-
-        plt.close()
-
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["progress"] = 100
-        jobs[job_id]["message"] = "Poster generated successfully"
-        jobs[job_id]["file_path"] = output_files[0]  # Primary file
-        jobs[job_id]["file_paths"] = output_files  # All files
-        jobs[job_id]["file_url"] = f"/api/download/{job_id}"
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        if render_pool is pool:
+            print("⚠ Render worker pool broken, restarting it")
+            render_pool = _create_render_pool()
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+def _drain_progress():
+    """Apply status updates sent by render workers to the in-memory job store."""
+    while True:
+        item = progress_queue.get()
+        if item is None:
+            break
+        job_id, updates = item
+        # Late updates must not overwrite a job that has already finished
+        if job_id in jobs and jobs[job_id]["status"] not in FINISHED_STATES:
+            jobs[job_id].update(updates)
+
+def _complete_job(job_id: str, request: PosterRequest, result: dict):
+    """Register a finished job's outputs and mark it completed."""
+    etags = result.get("etags", {})
+    for output_file in result["file_paths"]:
+        output_store.register(output_file, etag=etags.get(output_file))
 
-    except Exception as e:
+    job = jobs[job_id]
+    job["file_path"] = result["file_paths"][0]  # Primary file
+    job["file_paths"] = list(result["file_paths"])  # All files
+    job["file_url"] = f"/api/download/{job_id}"
+
+    pyramids = [path for path in result["file_paths"] if deepzoom.is_pyramid(path)]
+    if pyramids:
+        job["tiles_path"] = pyramids[0]
+        job["tiles"] = dict(deepzoom.read_descriptor(pyramids[0]), url=f"/api/tiles/{job_id}/poster.dzi")
+
+    if "variants" in result:
+        for variant in result["variants"]:
+            for path in variant["file_paths"]:
+                output_store.register(path, etag=etags.get(path))
+            variant["file_url"] = f"/api/download/{job_id}?variant={variant['name']}"
+            job["file_paths"].extend(variant["file_paths"])
+        job["variants"] = result["variants"]
+        job["message"] = f"Bundle of {len(result['variants'])} posters generated successfully"
+    else:
+        job["message"] = "Poster generated successfully"
+
+    job["memory"] = result.get("memory")
+    job["render_adjustments"] = result.get("adjustments", [])
+
+    if "metrics" in result:
+        # Record run metrics so future estimates learn from this job. Recording
+        # appends to the history file, so it runs off the event loop
+        job["metrics"] = result["metrics"]
+        asyncio.get_running_loop().run_in_executor(None, _record_metrics, request, result["metrics"])
+
+    job["status"] = "completed"
+    job["progress"] = 100
+
+def _record_metrics(request: PosterRequest, metrics: dict):
+    try:
+        estimator.record(request, metrics)
+    except OSError as e:
+        print(f"Could not record job metrics: {e}")
+
+async def process_poster_generation(job_id: str, request: PosterRequest):
+    """Scheduled task to generate poster - runs in a render worker process."""
+    if jobs[job_id]["status"] == "cancelled":
+        # Cancelled between leaving the queue and starting
+        _forget_cancellation(job_id)
+        return
+    jobs[job_id]["status"] = "processing"
+    jobs[job_id]["message"] = "Starting render..."
+    output_dir = _reserve_output_dir(job_id)
+
+    try:
+        result = await _run_in_render_pool(render_worker.run_job, job_id, request, output_dir)
+        # A job cancelled after its last checkpoint still finishes; nobody will collect it
+        if jobs[job_id]["status"] != "cancelled":
+            _keep_output_dir(output_dir)
+            _complete_job(job_id, request, result)
+    except render_worker.JobCancelled:
+        pass  # Status was set by _cancel_job
+    except render_worker.JobTimeout as e:
+        if jobs[job_id]["status"] == "cancelled":
+            return
         jobs[job_id]["status"] = "failed"
-        jobs[job_id]["message"] = f"Error: {str(e)}"
+        jobs[job_id]["message"] = f"Timed out: {e}. Try a smaller distance or fewer layers."
         jobs[job_id]["progress"] = 0
-        print(f"Job {job_id} failed: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"⏱ Job {job_id} timed out: {e}")
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # Every job in the pool fails with it; there is no telling which one crashed it
+            e = RuntimeError("Render worker crashed, please try again")
+        if jobs[job_id]["status"] != "cancelled":
+            jobs[job_id]["status"] = "failed"
+            jobs[job_id]["message"] = f"Error: {str(e)}"
+            jobs[job_id]["progress"] = 0
+            print(f"Job {job_id} failed: {e}")
+    finally:
+        _forget_cancellation(job_id)
+        if jobs[job_id]["status"] != "completed":
+            output_store.remove(output_dir)  # Including whatever a stopped job wrote part way
+
+def _forget_cancellation(job_id: str):
+    if cancelled_jobs is not None:
+        cancelled_jobs.pop(job_id, None)
+
+def _reserve_output_dir(name: str):
+    """
+    Create and index the directory one render writes into. Until it is kept,
+    it expires FILE_EXPIRY_HOURS after the longest a job may run (taken as
+    FILE_EXPIRY_HOURS without a job timeout), so a render that never
+    completes cannot leave files behind for good.
+    """
+    output_dir = os.path.join(TEMP_POSTERS_DIR, name)
+    max_runtime = JOB_TIMEOUT_SECONDS or output_store.ttl_seconds
+    output_store.reserve(output_dir, expires_at=time.time() + max_runtime + output_store.ttl_seconds)
+    return output_dir
+
+def _keep_output_dir(output_dir: str):
+    """Keep a completed render's directory as long as the outputs registered in it."""
+    output_store.reserve(output_dir, expires_at=time.time() + output_store.ttl_seconds)
+
+def _cancel_job(job_id: str, reason: str):
+    """
+    Cancel a queued or running job. A queued job is dropped right away; a
+    running one stops at its worker's next checkpoint, and its slot frees up
+    then. Returns False if the job had already finished.
+    """
+    job = jobs[job_id]
+    if job["status"] in FINISHED_STATES:
+        return False
+    if not scheduler.remove(job_id) and cancelled_jobs is not None:
+        cancelled_jobs[job_id] = reason
+    job["status"] = "cancelled"
+    job["message"] = reason
+    print(f"✋ Job {job_id}: {reason}")
+    return True
+
+def reap_abandoned_jobs():
+    """Cancel unfinished jobs whose status has not been checked for ABANDONED_JOB_SECONDS."""
+    now = time.monotonic()
+    for job_id, job in list(jobs.items()):
+        if "last_seen" in job and job["status"] not in FINISHED_STATES \
+                and now - job["last_seen"] > ABANDONED_JOB_SECONDS:
+            _cancel_job(job_id, f"Cancelled: status not checked for {ABANDONED_JOB_SECONDS} seconds")
+
+async def _prewarm_location(city: str, country: str, distance: int, layers: List[str]):
+    return await _run_in_render_pool(render_worker.prewarm, city, country, distance, layers)
+
+async def _prerender_preview(data: dict):
+    """Render a popular preview ahead of time; a matching request then completes instantly."""
+    output_dir = _reserve_output_dir(f"prerender_{uuid.uuid4().hex}")
+    result = None
+    try:
+        result = await _run_in_render_pool(render_worker.prerender, PosterRequest(**data), output_dir)
+    finally:
+        if result is None:
+            output_store.remove(output_dir)
+    if result is None:
+        return False
+    _keep_output_dir(output_dir)
+    for output_file in result["file_paths"]:
+        output_store.register(output_file, etag=result["etags"].get(output_file))
+    prerendered[request_fingerprint(data)] = result
+    return True
+
+def _take_prerendered(job_id: str, request: PosterRequest):
+    """Complete a job from a pre-rendered preview of the same request, if one is still stored."""
+    fingerprint = request_fingerprint(request.dict())
+    result = prerendered.get(fingerprint)
+    if result is None:
+        return None
+    if not all(output_store.get(path) and os.path.exists(path) for path in result["file_paths"]):
+        del prerendered[fingerprint]
+        prewarmer.forget_render(fingerprint)
+        return None
 
-async def process_poster_generation(job_id: str, request: PosterRequest):
-    """Background task to generate poster - runs blocking code in thread pool."""
-    # Run the synchronous poster generation in a thread pool to avoid blocking the event loop
-    await asyncio.to_thread(_generate_poster_sync, job_id, request)
+    jobs[job_id] = {
+        "status": "queued",
+        "message": "Job queued for processing",
+        "progress": 0,
+        "request": request.dict(),
+        "cost": 0.0,
+        "lane": None,
+        "adjustments": [],
+    }
+    _complete_job(job_id, request, {
+        "file_paths": result["file_paths"],
+        "etags": result["etags"],
+        "memory": result.get("memory"),
+    })
+    jobs[job_id]["message"] = "Poster ready (pre-rendered)"
+    return JobStatus(
+        job_id=job_id,
+        status="completed",
+        message=jobs[job_id]["message"],
+        file_url=jobs[job_id]["file_url"],
+        progress=100,
+        tiles=jobs[job_id].get("tiles")
+    )
+
+scheduler = JobScheduler(
+    process_poster_generation,
+    max_workers=MAX_CONCURRENT_JOBS,
+    max_heavy=MAX_CONCURRENT_HEAVY_JOBS,
+    heavy_threshold=HEAVY_JOB_COST,
+    max_cost=MAX_JOB_COST,
+    max_queued=MAX_QUEUED_JOBS,
+    max_heavy_wait=HEAVY_JOB_MAX_WAIT,
+)
 
 @app.get("/api/job/{job_id}", response_model=JobStatus)
 async def get_job_status(job_id: str):
@@ -408,22 +662,99 @@ async def get_job_status(job_id: str):
         raise HTTPException(status_code=404, detail="Job not found")
 
     job = jobs[job_id]
+    job["last_seen"] = time.monotonic()
+    return _job_status(job_id, job)
+
+@app.delete("/api/job/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job, e.g. because the request was corrected or the page closed."""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    job = jobs[job_id]
+    if not _cancel_job(job_id, "Cancelled by request") and job["status"] != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return _job_status(job_id, job)
+
+def _job_status(job_id: str, job: dict):
     return JobStatus(
         job_id=job_id,
         status=job["status"],
         message=job["message"],
         file_url=job.get("file_url"),
-        progress=job["progress"]
+        progress=job["progress"],
+        lane=job.get("lane"),
+        queue_position=scheduler.position(job_id),
+        variants=[
+            {"name": v["name"], "width": v["width"], "height": v["height"], "file_url": v["file_url"]}
+            for v in job.get("variants", [])
+        ] or None,
+        memory=job.get("memory"),
+        # Adjustments made at submission plus those made by the render worker
+        adjustments=job.get("adjustments", []) + job.get("render_adjustments", []) or None,
+        tiles=job.get("tiles")
     )
 
+def _parse_range(range_header: str, size: int):
+    """
+    Parse a single-range "bytes=start-end" header.
+    Returns (start, end) inclusive, None to serve the whole file, or raises
+    HTTPException(416) if the range cannot be satisfied.
+    """
+    if not range_header.startswith("bytes=") or "," in range_header:
+        return None  # Multiple or non-byte ranges: fall back to a full response
+
+    start_text, _, end_text = range_header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+def _matches_etag(http_request: Request, etag: str):
+    """Whether If-None-Match says the client already has this exact file."""
+    if_none_match = http_request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
 @app.get("/api/download/{job_id}")
 async def download_poster(
     job_id: str,
+    http_request: Request,
     download: bool = True,
     file_type: str = None,
-    background_tasks: BackgroundTasks = None
+    variant: str = None
 ):
-    """Download or view the generated poster. Supports multiple formats when format='both'."""
+    """
+    Download or view the generated poster. Supports multiple formats when format='both'
+    and single variants of a bundle. Honors If-None-Match and single-range Range requests.
+    """
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail="Job not found")
 
@@ -438,40 +769,73 @@ async def download_poster(
 
     # Determine which file to serve
     file_paths = job.get("file_paths", [])
+    primary_path = job.get("file_path")
     file_path = None
-    extension = "png"
-    media_type = "image/png"
+
+    if variant:
+        # A single variant of a bundle
+        match = next((v for v in job.get("variants", []) if v["name"] == variant), None)
+        if not match:
+            raise HTTPException(status_code=404, detail=f"Variant '{variant}' not found")
+        file_paths = match["file_paths"]
+        primary_path = file_paths[0]
+        theme = f"{theme}_{variant}"
 
     if file_type:
         # Find the specific file type requested
         for fp in file_paths:
             if fp.endswith(f".{file_type}"):
                 file_path = fp
-                extension = file_type
-                media_type = "image/svg+xml" if file_type == "svg" else "image/png"
                 break
 
     if not file_path:
         # Default to the primary file
-        file_path = job.get("file_path")
+        file_path = primary_path
 
-    if not file_path or not os.path.exists(file_path):
+    extension = file_path.rsplit('.', 1)[-1] if file_path else "png"
+    media_type = MEDIA_TYPES.get(extension, "application/octet-stream")
+
+    stored = output_store.get(file_path) if file_path else None
+    if not stored or not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Poster file not found")
 
     download_filename = f"{city_slug}_{theme}_poster.{extension}"
 
-    # Schedule cleanup in background after serving
-    if background_tasks:
-        background_tasks.add_task(cleanup_old_files)
-
     # Prepare headers based on download parameter
-    headers = {"Cache-Control": "no-cache"}
+    etag = stored["etag"]
+    headers = {
+        "Cache-Control": OUTPUT_CACHE_CONTROL,
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
     if download:
         headers["Content-Disposition"] = f'attachment; filename="{download_filename}"'
     else:
         headers["Content-Disposition"] = f'inline; filename="{download_filename}"'
 
-    # Stream the file
+    # Conditional request: the client already has this exact file
+    if _matches_etag(http_request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Range request, unless If-Range names a different version
+    size = stored["size"]
+    range_header = http_request.headers.get("range")
+    if_range = http_request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(
+                _iter_file(file_path, start, length),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+
+    # Stream the whole file
     return FileResponse(
         path=file_path,
         media_type=media_type,
@@ -479,29 +843,119 @@ async def download_poster(
         headers=headers
     )
 
+def _job_tiles_dir(job_id: str):
+    """Tile pyramid directory of a completed job, or raise HTTPException(404)."""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    tiles_dir = jobs[job_id].get("tiles_path")
+    if not tiles_dir or not output_store.get(tiles_dir) or not os.path.isdir(tiles_dir):
+        raise HTTPException(status_code=404, detail="No tiles for this job")
+    return tiles_dir
+
+def _tile_file_response(path: str, http_request: Request):
+    # Pyramid files never change either, and their URLs are unique to the job
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {"Cache-Control": OUTPUT_CACHE_CONTROL, "ETag": etag}
+    if _matches_etag(http_request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=path, media_type=MEDIA_TYPES[path.rsplit('.', 1)[-1]], headers=headers)
+
+@app.get("/api/tiles/{job_id}/poster.dzi")
+async def get_tile_descriptor(job_id: str, http_request: Request):
+    """Deep Zoom descriptor of a job's tile pyramid; DZI viewers load the tiles next to it."""
+    tiles_dir = _job_tiles_dir(job_id)
+    return _tile_file_response(os.path.join(tiles_dir, deepzoom.DESCRIPTOR_NAME), http_request)
+
+@app.get("/api/tiles/{job_id}/poster_files/{level}/{col}_{row}.webp")
+async def get_tile(job_id: str, level: int, col: int, row: int, http_request: Request):
+    """One WebP tile of a job's tile pyramid."""
+    tile = deepzoom.tile_path(_job_tiles_dir(job_id), level, col, row)
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return _tile_file_response(tile, http_request)
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/api/queue")
+async def queue_status():
+    """Current scheduler load per lane."""
+    stats = scheduler.stats()
+    if prewarmer is not None:
+        stats["prewarm"] = dict(prewarmer.stats, prerendered=len(prerendered))
+    return stats
+
 @app.on_event("startup")
 async def startup_event():
     """Run cleanup on startup and schedule periodic cleanup."""
     print("🚀 Starting Map Poster Generator API")
+
+    # Set up here rather than on import: run as a script, this module is
+    # imported again by every spawned render worker
+    global TEMP_POSTERS_DIR, output_store, estimator
+    TEMP_POSTERS_DIR = tempfile.mkdtemp(prefix="maptoposter_")
+    print(f"📁 Temporary posters directory: {TEMP_POSTERS_DIR}")
+    output_store = OutputStore(TEMP_POSTERS_DIR, ttl_seconds=FILE_EXPIRY_HOURS * 3600)
+    estimator = await asyncio.get_running_loop().run_in_executor(None, JobEstimator, JOB_METRICS_FILE)
+    output_store.sweep_orphans()
     cleanup_old_files()
 
-    # Schedule periodic cleanup every hour
+    # Start render workers, prewarming one per concurrent job slot
+    global render_pool, progress_queue, prewarm_stop, prewarmer, cancelled_jobs
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    prewarm_stop = context.Event()
+    cancelled_jobs = context.Manager().dict()
+    threading.Thread(target=_drain_progress, daemon=True).start()
+    render_pool = _create_render_pool()
+    loop = asyncio.get_running_loop()
+    for _ in range(MAX_CONCURRENT_JOBS):
+        loop.run_in_executor(render_pool, render_worker.warmup)
+
+    # Start the job dispatcher
+    asyncio.create_task(scheduler.run())
+
+    # Warm caches for popular locations whenever the workers are idle
+    if PREWARM_TOP_N > 0:
+        prewarmer = Prewarmer(
+            _prewarm_location,
+            scheduler.idle,
+            prewarm_stop,
+            top_n=PREWARM_TOP_N,
+            interval=PREWARM_INTERVAL_SECONDS,
+            rewarm_after=PREWARM_REWARM_HOURS * 3600,
+            render=_prerender_preview,
+            render_top=PREWARM_RENDER_TOP,
+        )
+        asyncio.create_task(prewarmer.run())
+
+    # Schedule periodic cleanup
     async def periodic_cleanup():
         while True:
-            await asyncio.sleep(3600)  # 1 hour
-            cleanup_old_files()
+            await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+            await asyncio.get_running_loop().run_in_executor(None, cleanup_old_files)
 
     asyncio.create_task(periodic_cleanup())
 
+    if ABANDONED_JOB_SECONDS > 0:
+        async def periodic_reap():
+            while True:
+                await asyncio.sleep(REAP_INTERVAL_SECONDS)
+                reap_abandoned_jobs()
+
+        asyncio.create_task(periodic_reap())
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
     print("🛑 Shutting down Map Poster Generator API")
+    if render_pool is not None:
+        render_pool.shutdown(wait=False, cancel_futures=True)
+    if progress_queue is not None:
+        progress_queue.put(None)
     # Optional: Remove temp directory on shutdown
     # shutil.rmtree(TEMP_POSTERS_DIR, ignore_errors=True)
 
@@ -0,0 +1,118 @@
+"""
+Deep Zoom tile pyramids for zoomable poster previews.
+
+A 300 or 600 DPI poster is tens of megapixels, too much to download just to
+look at it. Instead the render worker can cut the pixels it saved the PNG
+from into a Deep Zoom (DZI) pyramid of small WebP tiles, so a viewer only
+loads the tiles on screen at the current zoom. The highest level is the
+full-size image, each level below it is half the size of the one above,
+down to a single pixel at level 0.
+
+The layout is the one DZI viewers such as OpenSeadragon expect:
+
+  <directory>/poster.dzi                           XML descriptor
+  <directory>/poster_files/<level>/<col>_<row>.webp
+
+Tiles are TILE_SIZE pixels square, plus TILE_OVERLAP pixels shared with each
+neighbour so that scaled tiles meet without seams.
+"""
+import math
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+TILE_SIZE = 254  # 256 with the overlap on both sides
+TILE_OVERLAP = 1
+TILE_FORMAT = "webp"
+TILE_QUALITY = 80
+TILE_METHOD = 2  # WebP speed/size trade-off, 0 (fastest) to 6; above 2 saves little on map tiles
+TILE_THREADS = 4  # Pillow releases the GIL while encoding
+
+DESCRIPTOR_NAME = "poster.dzi"
+TILES_DIRNAME = "poster_files"
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+
+
+def max_level(width, height):
+    """Level holding the full-size image; level 0 is 1x1 pixels."""
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def _tile_box(col, row, width, height):
+    """Pixel box of a tile within its level, overlap included."""
+    left = col * TILE_SIZE - (TILE_OVERLAP if col else 0)
+    top = row * TILE_SIZE - (TILE_OVERLAP if row else 0)
+    right = min((col + 1) * TILE_SIZE + TILE_OVERLAP, width)
+    bottom = min((row + 1) * TILE_SIZE + TILE_OVERLAP, height)
+    return left, top, right, bottom
+
+
+def _write_tile(image, path, box, opaque):
+    tile = image.crop(box)
+    if opaque and tile.mode != "RGB":
+        tile = tile.convert("RGB")  # An alpha channel would only add to every tile
+    tile.save(path, format="WEBP", quality=TILE_QUALITY, method=TILE_METHOD)
+
+
+def write_pyramid(pixels, directory, checkpoint=None):
+    """
+    Write the tile pyramid of a (height, width, 3 or 4) uint8 image into
+    `directory`. `checkpoint` is called before each level so a cancelled job
+    can stop part way. Returns the descriptor, see read_descriptor.
+    """
+    from PIL import Image
+
+    image = Image.fromarray(pixels)
+    opaque = image.mode != "RGBA" or image.getextrema()[3][0] == 255
+    width, height = image.size
+    top_level = max_level(width, height)
+
+    tiles_dir = os.path.join(directory, TILES_DIRNAME)
+    with ThreadPoolExecutor(max_workers=TILE_THREADS) as pool:
+        for level in range(top_level, -1, -1):
+            if checkpoint is not None:
+                checkpoint()
+            if level < top_level:
+                image = image.reduce(2)  # Box filter; odd sizes round up, as DZI expects
+            level_dir = os.path.join(tiles_dir, str(level))
+            os.makedirs(level_dir, exist_ok=True)
+            level_width, level_height = image.size
+            futures = [
+                pool.submit(_write_tile, image, os.path.join(level_dir, f"{col}_{row}.{TILE_FORMAT}"),
+                            _tile_box(col, row, level_width, level_height), opaque)
+                for col in range(math.ceil(level_width / TILE_SIZE))
+                for row in range(math.ceil(level_height / TILE_SIZE))
+            ]
+            for future in futures:
+                future.result()
+
+    root = ET.Element("Image", xmlns=DZI_NAMESPACE, Format=TILE_FORMAT,
+                      Overlap=str(TILE_OVERLAP), TileSize=str(TILE_SIZE))
+    ET.SubElement(root, "Size", Width=str(width), Height=str(height))
+    ET.ElementTree(root).write(os.path.join(directory, DESCRIPTOR_NAME), encoding="UTF-8", xml_declaration=True)
+    return read_descriptor(directory)
+
+
+def is_pyramid(path):
+    return os.path.isfile(os.path.join(path, DESCRIPTOR_NAME))
+
+
+def read_descriptor(directory):
+    """The pyramid's .dzi descriptor as a dict: image and tile size, overlap, format, levels."""
+    root = ET.parse(os.path.join(directory, DESCRIPTOR_NAME)).getroot()
+    size = root.find(f"{{{DZI_NAMESPACE}}}Size")
+    width, height = int(size.get("Width")), int(size.get("Height"))
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": int(root.get("TileSize")),
+        "overlap": int(root.get("Overlap")),
+        "format": root.get("Format"),
+        "max_level": max_level(width, height),
+    }
+
+
+def tile_path(directory, level, col, row):
+    """File of one tile, or None if the pyramid has no such tile."""
+    path = os.path.join(directory, TILES_DIRNAME, str(level), f"{col}_{row}.{TILE_FORMAT}")
+    return path if os.path.isfile(path) else None
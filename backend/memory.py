@@ -0,0 +1,206 @@
+"""
+Per-job memory accounting and budgets for render workers.
+
+Render workers are long-lived, so ru_maxrss only ever reports the largest job
+a worker has run. Instead a background thread samples the process's current
+resident set size every few milliseconds and keeps the peak per job stage
+(geocode, graph, fetch, figure, savefig).
+
+Budgets are enforced at three points:
+  - before queueing, the estimator's predicted peak is checked and the request
+    is degraded (lower DPI, fewer layers) or rejected, see degrade_request;
+  - before savefig, the raster buffer size is known exactly and the DPI is
+    lowered if it would not fit, see fit_dpi;
+  - while a stage runs, a job whose RSS crosses the budget is interrupted and
+    fails with MemoryBudgetExceeded instead of inviting the OOM killer.
+"""
+import _thread
+import ctypes
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+SAMPLE_INTERVAL = 0.05  # Seconds between RSS samples while a job runs
+
+# Bytes per output pixel while saving a PNG: the RGBA buffer plus the copies
+# made while encoding it
+RASTER_BYTES_PER_PIXEL = 4 * 3
+
+ALLOWED_DPIS = (600, 300, 150)
+
+# Applied in order until a request fits its memory budget
+DEGRADE_STEPS = [
+    ("dpi", 300),
+    ("show_buildings", False),
+    ("dpi", 150),
+    ("show_railways", False),
+    ("show_parks", False),
+    ("show_water", False),
+]
+
+# Bundle variants share one set of layers, so only their DPI is lowered
+DPI_DEGRADE_STEPS = [step for step in DEGRADE_STEPS if step[0] == "dpi"]
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when a job needs more memory than its budget allows."""
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the lifetime peak (KB on Linux, bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if maxrss > 1 << 32 else maxrss / 1024
+
+
+def release_memory():
+    """Hand freed heap pages back to the OS after a large job (glibc only)."""
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def raster_mb(width, height, dpi):
+    """Memory needed to rasterise and encode a width x height inch PNG."""
+    return width * height * dpi * dpi * RASTER_BYTES_PER_PIXEL / (1024 * 1024)
+
+
+def fit_dpi(width, height, dpi, available_mb):
+    """Highest allowed DPI not above `dpi` whose raster fits in available_mb, or None."""
+    for candidate in ALLOWED_DPIS:
+        if candidate <= dpi and raster_mb(width, height, candidate) <= available_mb:
+            return candidate
+    return None
+
+
+def degrade_request(data, predict_peak_mb, budget_mb, steps=DEGRADE_STEPS):
+    """
+    Apply degrade steps to a request dict until predict_peak_mb(data) fits
+    budget_mb. Returns (data, adjustments); data is None if nothing fits.
+    """
+    data = dict(data)
+    adjustments = []
+    peak = predict_peak_mb(data)
+    for key, value in steps:
+        if peak <= budget_mb:
+            return data, adjustments
+        current = data.get(key)
+        if key == "dpi":
+            if data.get("format") == "svg" or current <= value:
+                continue
+            adjustments.append(f"DPI lowered from {current} to {value}")
+        else:
+            if not current:
+                continue
+            adjustments.append(f"{key.replace('show_', '').capitalize()} layer disabled")
+        data[key] = value
+        peak = predict_peak_mb(data)
+    if peak <= budget_mb:
+        return data, adjustments
+    return None, adjustments
+
+
+class MemoryMonitor:
+    """
+    Samples process RSS on a background thread and records the peak per stage.
+
+    One monitor lives in each render worker. begin_job() resets the counters;
+    `with monitor.stage(name):` attributes samples and elapsed time to a stage.
+    If the RSS goes over budget_mb while a stage runs, the main thread is
+    interrupted and the stage raises MemoryBudgetExceeded.
+    """
+
+    def __init__(self, budget_mb=None, interval=SAMPLE_INTERVAL):
+        self.budget_mb = budget_mb
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stage = None
+        self._stage_peak = 0.0
+        self._job_peak = 0.0
+        self._exceeded = False
+        self.baseline_mb = 0.0
+        self.stages = {}
+        self.stage_times = {}
+        self._thread = threading.Thread(target=self._sample_loop, name="memory-monitor", daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """Take one RSS sample. Returns it in MB."""
+        rss = current_rss_mb()
+        with self._lock:
+            self._job_peak = max(self._job_peak, rss)
+            if self._stage is None:
+                return rss
+            self._stage_peak = max(self._stage_peak, rss)
+            if self.budget_mb and rss > self.budget_mb and not self._exceeded:
+                self._exceeded = True
+                _thread.interrupt_main()
+        return rss
+
+    def begin_job(self):
+        with self._lock:
+            self.baseline_mb = current_rss_mb()
+            self._job_peak = self.baseline_mb
+            self._exceeded = False
+            self.stages = {}
+            self.stage_times = {}
+
+    @property
+    def exceeded(self):
+        return self._exceeded
+
+    def available_mb(self):
+        """Budget left above the current RSS, or None without a budget."""
+        if not self.budget_mb:
+            return None
+        return self.budget_mb - self.sample()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        rss = current_rss_mb()
+        with self._lock:
+            self._stage = name
+            self._stage_peak = rss
+        try:
+            yield
+        except KeyboardInterrupt:
+            if not self._exceeded:
+                raise
+            raise MemoryBudgetExceeded(
+                f"Job exceeded the {self.budget_mb:,.0f} MB memory budget while in stage '{name}'. "
+                "Try a lower DPI, a smaller poster or fewer layers."
+            ) from None
+        finally:
+            self.sample()
+            with self._lock:
+                self.stages[name] = round(max(self.stages.get(name, 0.0), self._stage_peak), 1)
+                self.stage_times[name] = round(self.stage_times.get(name, 0.0) + time.perf_counter() - start, 3)
+                self._stage = None
+
+    def summary(self):
+        """Per-stage and job peak RSS in MB, for job status and metrics."""
+        with self._lock:
+            return {
+                "stages": dict(self.stages),
+                "peak_mb": round(self._job_peak, 1),
+                "baseline_mb": round(self.baseline_mb, 1),
+                "budget_mb": self.budget_mb,
+            }
@@ -0,0 +1,44 @@
+"""
+Request models shared by the API process and the render workers.
+Kept separate from app.py so worker processes can unpickle requests without
+importing the web application.
+"""
+from typing import Optional, List, Dict
+
+from pydantic import BaseModel
+
+
+class PosterRequest(BaseModel):
+    city: str
+    country: str
+    theme: str = "feature_based"
+    distance: int = 29000
+
+    # Output configuration
+    width: int = 12
+    height: int = 16
+    dpi: int = 300
+    format: str = "png"  # png, svg, or both
+    tiles: bool = False  # Also cut the PNG into a deep-zoom tile pyramid for zoomable previews
+
+    # Feature toggles
+    show_water: bool = True
+    show_parks: bool = True
+    show_buildings: bool = False
+    show_railways: bool = False
+    show_attribution: bool = True
+
+    # Custom colors (optional overrides)
+    custom_colors: Optional[Dict[str, str]] = None
+
+
+class BundleVariant(BaseModel):
+    name: str
+    width: int
+    height: int
+    dpi: int = 300
+    format: str = "png"  # png, svg, or both
+
+
+class BundleRequest(PosterRequest):
+    variants: List[BundleVariant]
@@ -0,0 +1,244 @@
+"""
+Idle-time cache prewarming for popular locations.
+
+Most requests are for a few hundred popular cities. While no render jobs are
+queued or running, the prewarmer geocodes and fetches the map data for the
+most requested (city, country, distance) combinations, so the geocode cache
+and osmnx's HTTP cache already hold everything a later job for them needs and
+that job skips the network entirely.
+
+Popularity comes from a rolling request counter, topped up with the cities
+from the CLI examples until enough requests have been seen. Optionally the
+most requested preview renders are rendered ahead of time as well, so an
+identical request completes immediately.
+
+Prewarming yields to real work: submitting a job sets the stop event, which
+the worker checks between upstream calls, and nothing new is started until
+the scheduler is idle again.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, deque
+
+# The CLI examples (create_map_poster.print_examples): warmed before any traffic is seen
+SEED_LOCATIONS = [
+    ("New York", "USA", 12000),
+    ("Barcelona", "Spain", 8000),
+    ("Venice", "Italy", 4000),
+    ("Amsterdam", "Netherlands", 6000),
+    ("Dubai", "UAE", 15000),
+    ("Paris", "France", 10000),
+    ("Moscow", "Russia", 12000),
+    ("Tokyo", "Japan", 15000),
+    ("Marrakech", "Morocco", 5000),
+    ("Rome", "Italy", 8000),
+    ("San Francisco", "USA", 10000),
+    ("Sydney", "Australia", 12000),
+    ("Mumbai", "India", 18000),
+    ("London", "UK", 15000),
+    ("Budapest", "Hungary", 8000),
+]
+
+# Layers warmed for seed locations: the request defaults
+DEFAULT_LAYERS = ("water", "parks")
+
+# Request fields that select a feature layer
+LAYER_FIELDS = {
+    "water": "show_water",
+    "parks": "show_parks",
+    "buildings": "show_buildings",
+    "railways": "show_railways",
+}
+
+# Only preview-sized renders are worth rendering ahead of time
+PRERENDER_DPI = 150
+
+
+def location_key(city, country, distance):
+    """Requests for the same area share one key regardless of spelling case."""
+    return (city.strip().lower(), country.strip().lower(), int(distance))
+
+
+def request_fingerprint(data):
+    """Key for an exact poster request, used to match pre-rendered previews."""
+    return json.dumps(data, sort_keys=True)
+
+
+class RequestCounter:
+    """Request counts over a rolling window, kept in fixed-size time buckets."""
+
+    def __init__(self, window_seconds=24 * 3600, bucket_seconds=3600):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self._buckets = deque()  # (bucket start, Counter)
+        self._expired = set()  # keys of buckets that left the window since pop_expired
+
+    def _trim(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window_seconds:
+            _, counts = self._buckets.popleft()
+            self._expired.update(counts)
+
+    def add(self, key, now=None):
+        now = now if now is not None else time.time()
+        start = now - now % self.bucket_seconds
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append((start, Counter()))
+        self._buckets[-1][1][key] += 1
+        self._trim(now)
+
+    def top(self, n, now=None):
+        """The n most frequent keys in the window as (key, count) pairs."""
+        self._trim(now if now is not None else time.time())
+        total = Counter()
+        for _, counts in self._buckets:
+            total.update(counts)
+        return total.most_common(n)
+
+    def pop_expired(self, now=None):
+        """Keys no longer counted in the window that were counted before the last call."""
+        self._trim(now if now is not None else time.time())
+        expired = {key for key in self._expired if not any(key in counts for _, counts in self._buckets)}
+        self._expired.clear()
+        return expired
+
+
+class Prewarmer:
+    """
+    Background loop that warms caches while the render workers are idle.
+
+    `warm(city, country, distance, layers)` and `render(request_dict)` are
+    coroutines returning True once done and False if they were interrupted;
+    `is_idle()` tells whether real jobs are waiting or running. A location is
+    warmed again after `rewarm_after` seconds, or earlier if requests start
+    asking for layers it was not warmed with.
+    """
+
+    def __init__(self, warm, is_idle, stop_event, top_n=50, interval=30, rewarm_after=12 * 3600,
+                 render=None, render_top=0, counter=None):
+        self.warm = warm
+        self.is_idle = is_idle
+        self.stop_event = stop_event
+        self.top_n = top_n
+        self.interval = interval
+        self.rewarm_after = rewarm_after
+        self.render = render
+        self.render_top = render_top if render else 0
+        self.counter = counter or RequestCounter()
+        self.render_counter = RequestCounter()
+
+        self._locations = {}  # key -> (city, country, distance) as last requested
+        self._layers = {}  # key -> union of the layers requested for it
+        self._renders = {}  # fingerprint -> request dict
+        self._warmed = {}  # key or fingerprint -> (monotonic time, layers)
+        self.stats = {"warmed": 0, "rendered": 0, "interrupted": 0}
+
+        for city, country, distance in SEED_LOCATIONS:
+            key = location_key(city, country, distance)
+            self._locations[key] = (city, country, distance)
+            self._layers[key] = set(DEFAULT_LAYERS)
+
+    def note_request(self, data):
+        """Count one submitted request (dict form of a PosterRequest)."""
+        key = location_key(data["city"], data["country"], data["distance"])
+        self.counter.add(key)
+        self._prune()
+        self._locations[key] = (data["city"], data["country"], data["distance"])
+        self._layers.setdefault(key, set()).update(
+            layer for layer, field in LAYER_FIELDS.items() if data.get(field)
+        )
+
+        if self.render_top and data.get("dpi") == PRERENDER_DPI and data.get("format") == "png" \
+                and "variants" not in data:
+            fingerprint = request_fingerprint(data)
+            self.render_counter.add(fingerprint)
+            self._renders[fingerprint] = data
+
+    def _prune(self):
+        """Forget locations and renders whose requests have all left the counter window."""
+        seeds = {location_key(city, country, distance) for city, country, distance in SEED_LOCATIONS}
+        for key in self.counter.pop_expired() - seeds:
+            for entries in (self._locations, self._layers, self._warmed):
+                entries.pop(key, None)
+        for fingerprint in self.render_counter.pop_expired():
+            for entries in (self._renders, self._warmed):
+                entries.pop(fingerprint, None)
+
+    def interrupt(self):
+        """Ask a running warm-up to stop at its next checkpoint."""
+        self.stop_event.set()
+
+    def _is_fresh(self, key, layers=()):
+        warmed = self._warmed.get(key)
+        if warmed is None or time.monotonic() - warmed[0] > self.rewarm_after:
+            return False
+        return set(layers) <= warmed[1]
+
+    def candidates(self):
+        """Locations to warm, most requested first, then the seeds."""
+        keys = [key for key, _ in self.counter.top(self.top_n)]
+        for city, country, distance in SEED_LOCATIONS:
+            if len(keys) >= self.top_n:
+                break
+            key = location_key(city, country, distance)
+            if key not in keys:
+                keys.append(key)
+        return [key for key in keys if not self._is_fresh(key, self._layers[key])]
+
+    def render_candidates(self):
+        """Most requested preview renders that have not been rendered recently."""
+        return [fingerprint for fingerprint, _ in self.render_counter.top(self.render_top)
+                if not self._is_fresh(fingerprint)]
+
+    async def _run_once(self):
+        self._prune()
+        for key in self.candidates():
+            if not self.is_idle():
+                return
+            if key not in self._locations:
+                continue  # Pruned by a request that arrived meanwhile
+            self.stop_event.clear()
+            city, country, distance = self._locations[key]
+            layers = set(self._layers[key])
+            try:
+                done = await self.warm(city, country, distance, sorted(layers))
+            except Exception as e:
+                # Not retried before rewarm_after, so one bad location cannot block the rest
+                print(f"⚠ Prewarming {city}, {country} failed: {e}")
+                self._warmed[key] = (time.monotonic(), layers)
+                continue
+            if not done:
+                self.stats["interrupted"] += 1
+                return
+            self._warmed[key] = (time.monotonic(), layers)
+            self.stats["warmed"] += 1
+            print(f"♨ Prewarmed {city}, {country} ({distance} m)")
+
+        for fingerprint in self.render_candidates():
+            if not self.is_idle():
+                return
+            if fingerprint not in self._renders:
+                continue
+            self.stop_event.clear()
+            try:
+                done = await self.render(self._renders[fingerprint])
+            except Exception as e:
+                print(f"⚠ Pre-rendering a preview failed: {e}")
+                self._warmed[fingerprint] = (time.monotonic(), set())
+                continue
+            if not done:
+                self.stats["interrupted"] += 1
+                return
+            self._warmed[fingerprint] = (time.monotonic(), set())
+            self.stats["rendered"] += 1
+
+    def forget_render(self, fingerprint):
+        """Render a preview again on the next idle pass, e.g. after its files expired."""
+        self._warmed.pop(fingerprint, None)
+
+    async def run(self):
+        """Prewarm loop. Start once with asyncio.create_task on app startup."""
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.is_idle():
+                await self._run_once()
@@ -0,0 +1,888 @@
+"""
+Render worker processes.
+
+The API process hands each job to a pool of long-lived worker processes.
+Every worker imports osmnx/geopandas/matplotlib, selects the Agg backend,
+creates the poster FontProperties and loads all themes once when it starts,
+so per-job latency excludes import and font setup. Workers are recycled after
+a fixed number of jobs to cap memory growth from fragmentation and caches.
+
+Progress updates travel back to the API process over a multiprocessing queue;
+the finished job's files and metrics are returned as the task result.
+
+Posters are drawn through a renderer (see renderers.py): matplotlib by
+default, or the faster Agg raster renderer for PNG-only output. On request
+the pixels the PNG is saved from are also cut into a deep-zoom tile pyramid
+(see deepzoom.py), without rendering the poster again.
+
+Each job runs under a MemoryMonitor (see memory.py) that records peak memory
+per stage and enforces the worker's memory budget.
+
+While the pool is idle the API also uses the workers to prewarm caches (see
+prewarm.py). Prewarm tasks stop at their next checkpoint once the shared stop
+event is set.
+
+Jobs stop early when the API cancels them: cancelled job ids go into a
+shared dict that is checked at every stage boundary and between chunks,
+layers and bundle variants. Every stage also runs against a deadline, the
+shorter of its stage timeout and what is left of the job timeout. A SIGALRM
+timer enforces it, so a stage stuck waiting on an upstream server is
+interrupted too.
+"""
+import gc
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import create_map_poster as cmp
+from deepzoom import write_pyramid
+from memory import MemoryMonitor, MemoryBudgetExceeded, fit_dpi, raster_mb, release_memory
+from models import PosterRequest, BundleRequest
+from renderers import create_renderer
+from storage import file_etag, remove_output
+
+# Layered rendering only pays off once rasterising dominates the job
+LAYERED_MIN_MEGAPIXELS = 16
+COMPOSITE_STRIP_ROWS = 512  # Rows blended per NumPy pass, bounds temporary memory
+POOL_CHECKPOINT_SECONDS = 1.0  # How often a job waiting on forked processes checks for cancellation
+
+# Longest each job stage may run, in seconds. "fetch" also covers drawing
+# very large maps chunk by chunk, "layers" the whole layered render
+DEFAULT_STAGE_TIMEOUTS = {
+    "geocode": 60,
+    "graph": 600,
+    "fetch": 900,
+    "figure": 600,
+    "layers": 900,
+    "savefig": 600,
+    "tiles": 600,
+}
+
+# Set by init_worker in each worker process
+OUTPUT_DIR = None
+BUNDLE_RENDER_PROCESSES = 1
+LAYER_RENDER_PROCESSES = 0  # 0 or 1 disables layered rendering
+MEMORY_POLICY = "degrade"  # "degrade" lowers the DPI to fit the budget, "fail" rejects the job
+RENDER_BACKEND = "matplotlib"  # Renderer for PNG-only posters; SVG output always uses matplotlib
+_progress_queue = None
+_themes = {}
+_monitor = None
+_adjustments = []  # Degradations applied to the current job
+_forked_process = False  # True in processes forked to render bundle variants or layers
+_prewarm_stop = None  # Set by the API process when real jobs arrive
+_prewarming = False  # True while this worker pre-renders a preview
+JOB_TIMEOUT = 0  # Seconds a job may run in total, 0 for no limit
+STAGE_TIMEOUTS = dict(DEFAULT_STAGE_TIMEOUTS)
+_cancelled_jobs = None  # Shared dict of cancelled job ids, written by the API process
+_job_id = None  # Job running in this process; inherited by forked render processes
+_output_dir = None  # Where the current job writes its outputs
+_job_deadline = None  # time.monotonic() by which the current job must finish
+_deadline_message = None
+
+
+class PrewarmInterrupted(Exception):
+    """Raised at a checkpoint when prewarming has to make way for a real job."""
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint once the API has cancelled the running job."""
+
+
+class JobTimeout(BaseException):
+    """
+    Raised when a stage or the whole job runs past its deadline. Like
+    KeyboardInterrupt it can fire inside any code, so it is not an Exception:
+    the `except Exception` around optional fetches must not swallow it.
+    """
+
+
+def init_worker(progress_queue, output_dir, bundle_processes=1, memory_budget_mb=None,
+                memory_policy="degrade", layer_processes=0, prewarm_stop=None, renderer="matplotlib",
+                cancelled_jobs=None, job_timeout=0, stage_timeouts=None):
+    """Pool initializer: preload heavy modules, fonts and themes."""
+    global OUTPUT_DIR, BUNDLE_RENDER_PROCESSES, LAYER_RENDER_PROCESSES, MEMORY_POLICY, _progress_queue, _monitor
+    global _prewarm_stop, RENDER_BACKEND, _cancelled_jobs, JOB_TIMEOUT, STAGE_TIMEOUTS
+
+    OUTPUT_DIR = output_dir
+    BUNDLE_RENDER_PROCESSES = bundle_processes
+    LAYER_RENDER_PROCESSES = layer_processes
+    MEMORY_POLICY = memory_policy
+    _progress_queue = progress_queue
+    _monitor = MemoryMonitor(memory_budget_mb or None)
+    _prewarm_stop = prewarm_stop
+    RENDER_BACKEND = renderer
+    _cancelled_jobs = cancelled_jobs
+    JOB_TIMEOUT = job_timeout
+    STAGE_TIMEOUTS = dict(DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {}))
+    if hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGALRM, _on_deadline)
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import osmnx  # noqa: F401
+    import geopandas  # noqa: F401
+    import shapely  # noqa: F401
+
+    cmp.configure_upstreams()
+    cmp.get_poster_fonts()
+    for theme_name in cmp.get_available_themes():
+        _themes[theme_name] = cmp.load_theme(theme_name)
+
+    print(f"🔥 Render worker {os.getpid()} ready ({len(_themes)} themes preloaded)")
+
+
+def warmup():
+    """No-op task used to start workers ahead of the first job."""
+    return os.getpid()
+
+
+def report(job_id, **updates):
+    """Send job status updates (progress, message, ...) to the API process."""
+    if _progress_queue is not None and job_id:
+        _progress_queue.put((job_id, updates))
+
+
+def _is_cancelled(job_id):
+    if job_id is None or _cancelled_jobs is None:
+        return False
+    try:
+        return job_id in _cancelled_jobs
+    except (OSError, EOFError):
+        return False  # The API process is shutting down
+
+
+def _checkpoint():
+    """Stop the current job here if it was cancelled or is out of time."""
+    if _prewarming:
+        _check_prewarm_stop()
+    if _is_cancelled(_job_id):
+        raise JobCancelled("Job cancelled")
+    if _job_deadline is not None and time.monotonic() > _job_deadline:
+        raise JobTimeout(f"Job took longer than {JOB_TIMEOUT} seconds")
+
+
+def _on_deadline(signum, frame):
+    raise JobTimeout(_deadline_message)
+
+
+@contextmanager
+def _deadline(name):
+    """Interrupt the stage with JobTimeout once it overruns its stage timeout or the job deadline."""
+    global _deadline_message
+    timeout = STAGE_TIMEOUTS.get(name) or 0
+    message = f"Stage '{name}' took longer than {timeout} seconds"
+    if _job_deadline is not None:
+        remaining = max(_job_deadline - time.monotonic(), 0.01)
+        if not timeout or remaining < timeout:
+            timeout, message = remaining, f"Job took longer than {JOB_TIMEOUT} seconds (in stage '{name}')"
+    # Timers need the handler from init_worker, and signals only reach the main thread
+    armed = (timeout and hasattr(signal, "setitimer") and signal.getsignal(signal.SIGALRM) is _on_deadline
+             and threading.current_thread() is threading.main_thread())
+    if not armed:
+        yield
+        return
+    _deadline_message = message
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+@contextmanager
+def _stage(name, job_id=None):
+    """Run one job stage under the memory monitor and its deadline, then publish the updated peaks."""
+    _checkpoint()
+    with _monitor.stage(name), _deadline(name):
+        yield
+    report(job_id, memory=_monitor.summary())
+
+
+def _adjust(job_id, note):
+    """Record a degradation applied to the current job."""
+    _adjustments.append(note)
+    report(job_id, render_adjustments=list(_adjustments))
+
+
+def _fetch_map_data(job_id: str, request: PosterRequest, coords, dist: int):
+    """Download the street network and the enabled feature layers around coords."""
+    import osmnx as ox
+
+    report(job_id, message="Downloading street network...")
+
+    # Fetch street network
+    with _stage("graph", job_id):
+        G = ox.graph_from_point(coords, dist=dist, dist_type='bbox', network_type='all')
+    report(job_id, progress=35)
+    time.sleep(0.3)
+
+    # Fetch optional features based on toggles
+    water = None
+    parks = None
+    buildings = None
+    railways = None
+
+    with _stage("fetch", job_id):
+        if request.show_water:
+            try:
+                report(job_id, message="Downloading water features...")
+                water = ox.features_from_point(coords, tags=cmp.FEATURE_TAGS['water'], dist=dist)
+                report(job_id, progress=45)
+            except Exception:
+                pass
+            time.sleep(0.3)
+
+        if request.show_parks:
+            try:
+                report(job_id, message="Downloading parks...")
+                parks = ox.features_from_point(coords, tags=cmp.FEATURE_TAGS['parks'], dist=dist)
+                report(job_id, progress=50)
+            except Exception:
+                pass
+            time.sleep(0.3)
+
+        if request.show_buildings:
+            try:
+                report(job_id, message="Downloading buildings...")
+                buildings = ox.features_from_point(coords, tags=cmp.FEATURE_TAGS['buildings'], dist=dist)
+                report(job_id, progress=55)
+            except Exception:
+                pass
+            time.sleep(0.3)
+
+        if request.show_railways:
+            try:
+                report(job_id, message="Downloading railways...")
+                railways = ox.features_from_point(coords, tags=cmp.FEATURE_TAGS['railways'], dist=dist)
+                report(job_id, progress=60)
+            except Exception:
+                pass
+
+    return {"G": G, "water": water, "parks": parks, "buildings": buildings, "railways": railways}
+
+
+def _render_poster(request: PosterRequest, coords, data: dict, width: int, height: int,
+                   dpi: int, fmt: str, base_filename: str, extent=None, job_id: str = None, tiles: bool = False):
+    """
+    Draw the poster for already-fetched map data and save it as png/svg.
+    `extent` is an optional (west, south, east, north) view to frame the map to,
+    by default the view ox.plot_graph would pick. Returns the list of written
+    files, with the tile pyramid's directory last if `tiles` is set.
+    """
+    view = extent if extent is not None else cmp.graph_view(data["G"])
+    with _stage("figure", job_id):
+        renderer = _new_renderer(width, height, dpi, fmt, view, job_id)
+        # Feature layers are each merged into one compound shape (point features are skipped)
+        cmp.draw_map(renderer, data["G"], water=data["water"], parks=data["parks"],
+                     buildings=data["buildings"], railways=data["railways"])
+
+    return _finish_poster(renderer, request, coords, fmt, base_filename, job_id=job_id, tiles=tiles)
+
+
+def _new_renderer(width: int, height: int, dpi: int, fmt: str, view, job_id: str = None):
+    """
+    Renderer for one poster. The raster renderer allocates its pixel buffer
+    up front, so its DPI is fitted to the memory budget here rather than
+    before saving.
+    """
+    backend = RENDER_BACKEND if fmt == "png" else "matplotlib"
+    if backend != "matplotlib":
+        dpi = _fit_raster_dpi(width, height, dpi, job_id)
+    return create_renderer(backend, width, height, dpi, view, cmp.THEME['bg'])
+
+
+def _finish_poster(renderer, request: PosterRequest, coords, fmt: str, base_filename: str, job_id: str = None,
+                   tiles: bool = False):
+    """
+    Add gradients and typography to a drawn map and save it, plus a tile
+    pyramid of the PNG if `tiles` is set. Returns the written files.
+    """
+    with _stage("figure", job_id):
+        cmp.draw_poster_text(renderer, request.city, request.country, coords,
+                             show_attribution=request.show_attribution)
+
+    report(job_id, progress=90, message="Saving poster...")
+
+    output_files = []
+    pixels = None
+
+    # Save based on format request
+    try:
+        with _stage("savefig", job_id):
+            if fmt in ["png", "both"]:
+                if renderer.dpi_at_save:
+                    renderer.dpi = _fit_raster_dpi(renderer.width, renderer.height, renderer.dpi, job_id)
+                png_file = os.path.join(_output_dir, f"{base_filename}.png")
+                if tiles:
+                    pixels = renderer.save_with_pixels(png_file)
+                else:
+                    renderer.save(png_file, 'png')
+                output_files.append(png_file)
+
+            if fmt in ["svg", "both"]:
+                svg_file = os.path.join(_output_dir, f"{base_filename}.svg")
+                renderer.save(svg_file, 'svg')
+                output_files.append(svg_file)
+    finally:
+        renderer.close()
+
+    if pixels is not None:
+        output_files.append(_write_tiles(pixels, base_filename, output_files, job_id))
+    return output_files
+
+
+def _write_tiles(pixels, base_filename: str, saved_files, job_id: str = None):
+    """
+    Cut a saved poster's pixels into a deep-zoom tile pyramid. Returns its
+    directory. If the job is stopped part way, the partial pyramid and the
+    already `saved_files` are deleted, as the job will never serve them.
+    """
+    report(job_id, progress=95, message="Cutting preview tiles...")
+    tiles_dir = os.path.join(_output_dir, f"{base_filename}_tiles")
+    try:
+        with _stage("tiles", job_id):
+            write_pyramid(pixels, tiles_dir, checkpoint=_checkpoint)
+    except (JobCancelled, JobTimeout):
+        for path in [*saved_files, tiles_dir]:
+            remove_output(path)
+        raise
+    return tiles_dir
+
+
+def _fit_raster_dpi(width: float, height: float, dpi: int, job_id: str = None):
+    """
+    Lower the PNG DPI if the raster buffer would not fit in what is left of
+    the memory budget. Raises MemoryBudgetExceeded under the "fail" policy or
+    when even the lowest DPI does not fit.
+    """
+    available = _monitor.available_mb()
+    if available is None or raster_mb(width, height, dpi) <= available:
+        return dpi
+
+    fitted = fit_dpi(width, height, dpi, available) if MEMORY_POLICY == "degrade" else None
+    if fitted is None:
+        raise MemoryBudgetExceeded(
+            f"Saving a {width:g}x{height:g} inch poster at {dpi} DPI needs "
+            f"~{raster_mb(width, height, dpi):,.0f} MB, but only {max(available, 0):,.0f} MB of the "
+            f"{_monitor.budget_mb:,.0f} MB memory budget is left. Try a lower DPI or a smaller poster."
+        )
+    _adjust(job_id, f"DPI lowered from {dpi} to {fitted}")
+    return fitted
+
+
+def _render_poster_chunked(job_id: str, request: PosterRequest, coords):
+    """
+    Fetch and draw the map in spatial chunks so that only one chunk's graph and
+    features are in memory at a time; the drawn geometry accumulates in the
+    renderer until save. Returns (edge_count, output_files).
+    """
+    layers = [
+        layer for layer, enabled in (
+            ('water', request.show_water),
+            ('parks', request.show_parks),
+            ('buildings', request.show_buildings),
+            ('railways', request.show_railways),
+        ) if enabled
+    ]
+
+    def on_chunk(done, total):
+        _checkpoint()
+        report(job_id, progress=15 + int(65 * done / total), message=f"Downloading and drawing map area {done} of {total}...")
+
+    report(job_id, message="Downloading map in chunks...")
+    with _stage("fetch", job_id):
+        renderer = _new_renderer(request.width, request.height, request.dpi, request.format,
+                                 cmp.map_bbox(coords, request.distance), job_id)
+        edge_count = cmp.draw_map_chunked(renderer, coords, request.distance, layers=layers, on_chunk=on_chunk)
+
+    report(job_id, progress=80, message="Rendering map...")
+    output_files = _finish_poster(
+        renderer, request, coords, request.format, _output_basename(request), job_id=job_id, tiles=request.tiles
+    )
+    return edge_count, output_files
+
+
+def _load_job_theme(request: PosterRequest):
+    """Load the request's theme into create_map_poster, applying custom color overrides."""
+    if request.theme in _themes:
+        cmp.THEME = dict(_themes[request.theme])
+    else:
+        cmp.THEME = cmp.load_theme(request.theme)
+    if request.custom_colors:
+        cmp.THEME.update(request.custom_colors)
+
+
+def _output_basename(request: PosterRequest):
+    # Jobs for the same city and theme can finish within the same second; a
+    # shared name would overwrite an output already served as immutable
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    city_slug = request.city.lower().replace(' ', '_')
+    return f"{city_slug}_{request.theme}_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+
+def _variant_extent(coords, dist: int, width: int, height: int):
+    """
+    Frame a variant inside the fetched square: the longer side of the poster
+    spans the full radius, the shorter side is cropped to match the aspect ratio.
+    Returns (west, south, east, north) in degrees.
+    """
+    lat, lon = coords
+    if width >= height:
+        half_width, half_height = dist, dist * height / width
+    else:
+        half_width, half_height = dist * width / height, dist
+
+    meters_per_degree = 111320
+    dlat = half_height / meters_per_degree
+    dlon = half_width / (meters_per_degree * math.cos(math.radians(lat)))
+    return (lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+
+
+# Shared with forked render processes; set only while a bundle is rendering
+_bundle_context = {}
+
+
+def _forked_budget_mb(processes: int, reserve_mb: float = 0.0):
+    """
+    Memory budget for each of `processes` forked children, so that together
+    they stay within the job's budget. A child starts out sharing the parent's
+    resident pages, so it may use those plus an equal share of what is left
+    after the `reserve_mb` the parent still needs. None without a budget.
+    """
+    available = _monitor.available_mb()
+    if available is None:
+        return None
+    parent_mb = _monitor.budget_mb - available
+    return parent_mb + max(available - reserve_mb, 0.0) / processes
+
+
+def _init_forked_process(budget_mb):
+    """Forked render processes need a monitor of their own: threads do not survive fork."""
+    global _monitor, _forked_process
+    _monitor = MemoryMonitor(budget_mb)
+    _forked_process = True
+
+
+def _abort_pool(pool):
+    """
+    Stop a fork pool without waiting for its tasks, once the job is cancelled
+    or out of time. Leaving the `with` block would wait for every queued task.
+    """
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _wait_result(future):
+    """future.result(), reaching a checkpoint every POOL_CHECKPOINT_SECONDS while waiting."""
+    while True:
+        try:
+            return future.result(timeout=POOL_CHECKPOINT_SECONDS)
+        except TimeoutError:
+            _checkpoint()
+
+
+def _render_bundle_variant(index: int):
+    """
+    Render one bundle variant. Runs in a forked process that inherited _bundle_context.
+    Returns (index, files, adjustments, peak memory in MB of the variant's process).
+    """
+    ctx = _bundle_context
+    request = ctx["request"]
+    variant = request.variants[index]
+    if _forked_process:
+        _monitor.begin_job()
+    first_adjustment = len(_adjustments)
+
+    extent = _variant_extent(ctx["coords"], request.distance, variant.width, variant.height)
+    base_filename = f"{ctx['base_filename']}_{variant.name}"
+    files = _render_poster(
+        request, ctx["coords"], ctx["data"], variant.width, variant.height,
+        variant.dpi, variant.format, base_filename, extent=extent
+    )
+    adjustments = [f"{variant.name}: {note}" for note in _adjustments[first_adjustment:]]
+    del _adjustments[first_adjustment:]
+    return index, files, adjustments, _monitor.summary()["peak_mb"]
+
+
+def _render_bundle_variants(request: BundleRequest):
+    """
+    Yield _render_bundle_variant results for every variant. Variants render
+    in parallel processes forked after the fetch, so the map data is shared
+    copy-on-write rather than pickled; without fork they render one by one.
+    The memory budget is split between the variant processes.
+    """
+    indices = range(len(request.variants))
+    processes = min(BUNDLE_RENDER_PROCESSES, len(request.variants))
+
+    if processes <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for index in indices:
+            yield _render_bundle_variant(index)
+        return
+
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_forked_process,
+                             initargs=(_forked_budget_mb(processes),)) as pool:
+        try:
+            pending = {pool.submit(_render_bundle_variant, index) for index in indices}
+            while pending:
+                finished, pending = wait(pending, timeout=POOL_CHECKPOINT_SECONDS, return_when=FIRST_COMPLETED)
+                _checkpoint()
+                for future in finished:
+                    yield future.result()
+        except BaseException:  # Including GeneratorExit when the caller stops early
+            _abort_pool(pool)
+            raise
+
+
+# Shared with forked layer processes; set only while a layered render runs
+_layer_context = {}
+
+
+def _use_layered_render(request: PosterRequest):
+    """
+    Whether to rasterise this poster's layers in parallel processes. Only
+    large PNG-only posters qualify, and only if every layer buffer fits in
+    the memory budget at once.
+    """
+    if LAYER_RENDER_PROCESSES <= 1 or request.format != "png":
+        return False
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return False
+    if request.width * request.height * request.dpi ** 2 / 1e6 < LAYERED_MIN_MEGAPIXELS:
+        return False
+    available = _monitor.available_mb()
+    needed = raster_mb(request.width, request.height, request.dpi) * (LAYER_RENDER_PROCESSES + 1)
+    return available is None or needed <= available
+
+
+def _rasterize_layer(layer: str):
+    """
+    Draw one poster layer on a transparent canvas at the final pixel size.
+    Runs in a forked process that inherited _layer_context, under that
+    process's share of the memory budget. Returns the straight-alpha RGBA
+    pixels as a (height, width, 4) uint8 array and the process's peak memory
+    in MB.
+    """
+    ctx = _layer_context
+    request = ctx["request"]
+    data = ctx["data"]
+    if _forked_process:
+        _monitor.begin_job()
+
+    try:
+        with _stage("layers"):
+            renderer = create_renderer(RENDER_BACKEND, request.width, request.height, request.dpi,
+                                       ctx["view"], None)
+            if layer == "roads":
+                cmp.draw_roads(renderer, data["G"])
+            elif layer == "overlay":
+                cmp.draw_poster_text(renderer, request.city, request.country, ctx["coords"],
+                                     show_attribution=request.show_attribution)
+            else:
+                cmp.draw_feature_layer(renderer, layer, data[layer])
+            _checkpoint()
+            pixels = renderer.rgba()
+    except KeyboardInterrupt:
+        # As in run_job: the budget interrupt can land just after the stage
+        if not _monitor.exceeded:
+            raise
+        raise MemoryBudgetExceeded(
+            f"Layer '{layer}' exceeded its {_monitor.budget_mb:,.0f} MB share of the memory budget"
+        ) from None
+    return pixels, _monitor.summary()["peak_mb"]
+
+
+def _composite_over(dst, src):
+    """Alpha-composite straight-alpha RGBA `src` over the opaque RGB image `dst`, in place."""
+    import numpy as np
+
+    for start in range(0, dst.shape[0], COMPOSITE_STRIP_ROWS):
+        strip = src[start:start + COMPOSITE_STRIP_ROWS]
+        alpha = strip[..., 3:4].astype(np.uint16)
+        if not alpha.any():
+            continue
+        target = dst[start:start + COMPOSITE_STRIP_ROWS]
+        target[...] = (strip[..., :3] * alpha + target * (255 - alpha) + 127) // 255
+
+
+def _render_poster_layered(job_id: str, request: PosterRequest, coords, data: dict, base_filename: str):
+    """
+    Render a PNG poster with every layer rasterised in its own forked process,
+    then alpha-composited onto the background in z-order. Over-compositing is
+    associative, so the result matches drawing everything into one figure.
+    Returns the written files and the peak memory in MB of each layer process.
+    """
+    import matplotlib.colors as mcolors
+    import matplotlib.image as mimage
+    import numpy as np
+
+    # Same stacking as cmp.draw_map: roads above water, below the other feature layers
+    layers = [layer for layer in ("water", "roads", "parks", "buildings", "railways")
+              if layer == "roads" or data[layer] is not None]
+    layers.append("overlay")
+
+    height_px = int(round(request.height * request.dpi))
+    width_px = int(round(request.width * request.dpi))
+    background = np.array(mcolors.to_rgb(cmp.THEME['bg'])) * 255
+    image = np.empty((height_px, width_px, 3), dtype=np.uint8)
+    image[...] = np.round(background).astype(np.uint8)
+
+    view = cmp.graph_view(data["G"])
+    layer_memory = {}
+    _layer_context.update(request=request, coords=coords, data=data, view=view)
+    context = multiprocessing.get_context("fork")
+    try:
+        with _stage("layers", job_id):
+            processes = min(LAYER_RENDER_PROCESSES, len(layers))
+            # The parent holds one layer buffer at a time while compositing
+            budget_mb = _forked_budget_mb(processes, reserve_mb=raster_mb(request.width, request.height, request.dpi))
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_forked_process,
+                                     initargs=(budget_mb,)) as pool:
+                futures = [pool.submit(_rasterize_layer, layer) for layer in layers]
+                # Composite strictly in z-order; later layers keep rendering meanwhile.
+                # Each future is dropped once composited, so its layer buffer is freed
+                try:
+                    for done, layer in enumerate(layers, start=1):
+                        _checkpoint()
+                        pixels, layer_memory[layer] = _wait_result(futures.pop(0))
+                        _composite_over(image, pixels)
+                        pixels = None
+                        report(job_id, progress=80 + int(10 * done / len(layers)),
+                               message=f"Composited layer {done} of {len(layers)}...")
+                except BaseException:
+                    _abort_pool(pool)
+                    raise
+    finally:
+        _layer_context.clear()
+
+    report(job_id, progress=90, message="Saving poster...")
+    with _stage("savefig", job_id):
+        png_file = os.path.join(_output_dir, f"{base_filename}.png")
+        mimage.imsave(png_file, image, dpi=request.dpi, format='png')
+    if request.tiles:
+        return [png_file, _write_tiles(image, base_filename, [png_file], job_id)], layer_memory
+    return [png_file], layer_memory
+
+
+def generate_poster(job_id: str, request: PosterRequest):
+    """Generate a single poster. Returns the output files, run metrics and memory use."""
+    job_start = time.perf_counter()
+
+    report(job_id, status="processing", progress=10, message="Geocoding location...")
+
+    _load_job_theme(request)
+
+    # Get coordinates
+    with _stage("geocode", job_id):
+        coords = cmp.get_coordinates(request.city, request.country)
+    report(job_id, progress=15)
+
+    layer_memory = None  # Peak MB per layer process, for layered renders
+    if request.distance > cmp.CHUNKED_FETCH_DISTANCE:
+        # Very large radius: stream the area chunk by chunk into one figure
+        edge_count, output_files = _render_poster_chunked(job_id, request, coords)
+    else:
+        data = _fetch_map_data(job_id, request, coords, request.distance)
+        edge_count = data["G"].number_of_edges()
+        report(job_id, progress=80, message="Rendering map...")
+
+        if _use_layered_render(request):
+            output_files, layer_memory = _render_poster_layered(job_id, request, coords, data,
+                                                                _output_basename(request))
+        else:
+            output_files = _render_poster(
+                request, coords, data, request.width, request.height,
+                request.dpi, request.format, _output_basename(request), job_id=job_id, tiles=request.tiles
+            )
+        data = None
+
+    memory = _monitor.summary()
+    peak_mb = memory["peak_mb"]
+    if layer_memory:
+        memory["layers"] = layer_memory
+        # Layer processes start from the parent's pages, so the largest of them bounds the job's peak
+        peak_mb = max(peak_mb, *layer_memory.values())
+    metrics = {
+        "duration_seconds": round(time.perf_counter() - job_start, 3),
+        "peak_memory_mb": peak_mb,
+        # Tile pyramids are extra; the estimate is for the poster files themselves
+        "output_size_mb": round(sum(os.path.getsize(f) for f in output_files if os.path.isfile(f)) / (1024 * 1024), 3),
+        "edge_count": edge_count,
+        "stage_times": dict(_monitor.stage_times),
+        "stage_memory_mb": memory["stages"],
+    }
+    return {"file_paths": output_files, "metrics": metrics, "memory": memory,
+            "adjustments": list(_adjustments)}
+
+
+def generate_bundle(job_id: str, request: BundleRequest):
+    """Fetch the map data once and render every variant of a bundle."""
+    report(job_id, status="processing", progress=10, message="Geocoding location...")
+
+    _load_job_theme(request)
+
+    with _stage("geocode", job_id):
+        coords = cmp.get_coordinates(request.city, request.country)
+    report(job_id, progress=15)
+
+    # Every variant is framed inside the square fetched for request.distance
+    data = _fetch_map_data(job_id, request, coords, request.distance)
+    report(job_id, progress=80, message=f"Rendering {len(request.variants)} variants...")
+
+    base_filename = _output_basename(request)
+    _bundle_context.update(request=request, coords=coords, data=data, base_filename=base_filename)
+    try:
+        variant_files = {}
+        variant_memory = {}
+        # closing() stops the variant processes right away if this loop raises
+        with closing(_render_bundle_variants(request)) as results:
+            for index, files, adjustments, peak_mb in results:
+                _checkpoint()
+                variant_files[index] = files
+                variant_memory[request.variants[index].name] = peak_mb
+                for note in adjustments:
+                    _adjust(job_id, note)
+                done = len(variant_files)
+                report(job_id, progress=80 + int(15 * done / len(request.variants)),
+                       message=f"Rendered {done} of {len(request.variants)} variants...")
+    finally:
+        _bundle_context.clear()
+
+    report(job_id, progress=95, message="Packaging bundle...")
+
+    # Zip every output; PNGs are already compressed so they are stored as-is
+    city_slug = request.city.lower().replace(' ', '_')
+    zip_file = os.path.join(_output_dir, f"{base_filename}_bundle.zip")
+    variants = []
+    with zipfile.ZipFile(zip_file, 'w') as zf:
+        for index, variant in enumerate(request.variants):
+            files = variant_files[index]
+            for path in files:
+                extension = path.rsplit('.', 1)[-1]
+                compression = zipfile.ZIP_STORED if extension == "png" else zipfile.ZIP_DEFLATED
+                arcname = f"{city_slug}_{request.theme}_{variant.name}.{extension}"
+                zf.write(path, arcname, compress_type=compression)
+            variants.append({
+                "name": variant.name,
+                "width": variant.width,
+                "height": variant.height,
+                "dpi": variant.dpi,
+                "format": variant.format,
+                "file_paths": files,
+            })
+
+    memory = _monitor.summary()
+    memory["variants"] = variant_memory
+    return {"file_paths": [zip_file], "variants": variants, "memory": memory,
+            "adjustments": list(_adjustments)}
+
+
+def _output_etags(result):
+    """ETags of a result's output files, hashed here so the API never reads them on its event loop."""
+    paths = list(result["file_paths"])
+    for variant in result.get("variants", []):
+        paths.extend(variant["file_paths"])
+    return {path: file_etag(path) for path in paths if os.path.isfile(path)}
+
+
+def run_job(job_id: str, request: PosterRequest, output_dir: str = None):
+    """
+    Pool entry point: dispatch to the poster or bundle pipeline under the
+    memory monitor and the job deadline, writing into `output_dir` (default
+    OUTPUT_DIR). Raises JobCancelled or JobTimeout when the job is stopped
+    early.
+    """
+    global _job_id, _job_deadline, _output_dir
+
+    _monitor.begin_job()
+    _adjustments.clear()
+    _job_id = job_id
+    _output_dir = output_dir or OUTPUT_DIR
+    _job_deadline = time.monotonic() + JOB_TIMEOUT if JOB_TIMEOUT else None
+    try:
+        if isinstance(request, BundleRequest):
+            result = generate_bundle(job_id, request)
+        else:
+            result = generate_poster(job_id, request)
+        result["etags"] = _output_etags(result)
+        return result
+    except KeyboardInterrupt:
+        # The budget interrupt can land just after the stage that triggered it
+        if not _monitor.exceeded:
+            raise
+        raise MemoryBudgetExceeded(f"Job exceeded the {_monitor.budget_mb:,.0f} MB memory budget") from None
+    finally:
+        _job_id = _job_deadline = _output_dir = None
+        # Drop whatever a failed job left behind before the worker takes the next one
+        gc.collect()
+        release_memory()
+
+
+def _check_prewarm_stop():
+    if _prewarm_stop is not None and _prewarm_stop.is_set():
+        raise PrewarmInterrupted()
+
+
+def prewarm(city: str, country: str, distance: int, layers):
+    """
+    Warm the geocode and HTTP caches for one location by geocoding it and
+    making the same upstream requests a job for it would make. The results
+    are discarded. Returns False if prewarming was stopped part way.
+    """
+    import osmnx as ox
+
+    try:
+        _check_prewarm_stop()
+        coords = cmp.get_coordinates(city, country)
+
+        if distance > cmp.CHUNKED_FETCH_DISTANCE:
+            for bbox in cmp.chunk_bboxes(coords, distance):
+                _check_prewarm_stop()
+                cmp.fetch_chunk(bbox, layers)
+            return True
+
+        _check_prewarm_stop()
+        try:
+            ox.graph_from_point(coords, dist=distance, dist_type='bbox', network_type='all')
+        except ValueError:
+            pass  # No streets; a job would fail the same way
+        for layer in layers:
+            _check_prewarm_stop()
+            try:
+                ox.features_from_point(coords, tags=cmp.FEATURE_TAGS[layer], dist=distance)
+            except Exception:
+                pass
+        return True
+    except PrewarmInterrupted:
+        return False
+    finally:
+        gc.collect()
+
+
+def prerender(request: PosterRequest, output_dir: str = None):
+    """
+    Render a poster ahead of time for the prewarmer. Returns the run_job
+    result, or None if prewarming was stopped part way.
+    """
+    global _prewarming
+
+    _prewarming = True
+    try:
+        return run_job(None, request, output_dir)
+    except PrewarmInterrupted:
+        return None
+    except JobTimeout as e:
+        raise RuntimeError(str(e)) from None  # A failed pre-render, not a reason to stop prewarming
+    finally:
+        _prewarming = False
@@ -0,0 +1,197 @@
+"""
+Cost-based admission control and priority scheduling for render jobs.
+
+Every request is given a rough cost from its map radius, output pixel count
+and enabled layers. Cheap jobs go to the interactive lane, expensive ones to
+the heavy lane, and only a limited number of heavy jobs may run at once so a
+large print render can never starve a queue of quick previews.
+"""
+import asyncio
+import time
+from collections import deque
+
+# Reference job: a 10 km, 12x16 poster at 300 DPI with water and parks.
+REFERENCE_DISTANCE = 10000
+REFERENCE_PIXELS = 12 * 16 * 300 * 300
+
+# Jobs at or above this cost go to the heavy lane. The API's default request
+# (29 km, cost ~11) stays interactive, as does the same poster at 600 DPI;
+# adding buildings to it, or a radius above ~35 km, makes a job heavy.
+HEAVY_THRESHOLD = 16.0
+
+# Relative cost of each optional layer on top of the street network
+LAYER_WEIGHTS = {
+    'show_water': 0.10,
+    'show_parks': 0.15,
+    'show_buildings': 1.50,
+    'show_railways': 0.05,
+}
+
+# How much of the cost comes from rasterising vs. fetching/drawing geometry
+RASTER_WEIGHT = 0.5
+
+LANES = ("interactive", "heavy")
+
+
+def _geometry_cost(data):
+    """Cost of fetching and drawing the map geometry, independent of output size."""
+    area_factor = (data.get('distance', 29000) / REFERENCE_DISTANCE) ** 2
+    layer_factor = 1.0 + sum(weight for key, weight in LAYER_WEIGHTS.items() if data.get(key))
+    return area_factor * layer_factor
+
+
+def _raster_cost(data):
+    """Cost of rasterising one output. SVG output skips the raster step entirely."""
+    if data.get('format') == 'svg':
+        return 0.0
+    pixels = data.get('width', 12) * data.get('height', 16) * data.get('dpi', 300) ** 2
+    return RASTER_WEIGHT * pixels / REFERENCE_PIXELS
+
+
+def estimate_job_cost(request):
+    """
+    Estimate the relative cost of a poster request.
+    Accepts a PosterRequest or its dict form. A cost of ~1.0 is a 10 km,
+    12x16 inch, 300 DPI poster with water and parks.
+    """
+    data = request if isinstance(request, dict) else request.dict()
+    return round(_geometry_cost(data) + _raster_cost(data), 3)
+
+
+def estimate_bundle_cost(request):
+    """Cost of a bundle: the map data is fetched once, each variant is rasterised."""
+    data = request if isinstance(request, dict) else request.dict()
+    raster = sum(_raster_cost(variant) for variant in data.get('variants', []))
+    return round(_geometry_cost(data) + raster, 3)
+
+
+class AdmissionError(Exception):
+    """Raised when a job cannot be accepted by the scheduler."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobScheduler:
+    """
+    Two-lane priority scheduler.
+
+    Interactive jobs are always dispatched first. Heavy jobs are dispatched
+    only while fewer than `max_heavy` of them are running, and a heavy job
+    that has waited longer than `max_heavy_wait` seconds jumps ahead of
+    the interactive lane so it is never starved indefinitely.
+    """
+
+    def __init__(self, runner, max_workers=2, max_heavy=1, heavy_threshold=HEAVY_THRESHOLD,
+                 max_cost=40.0, max_queued=50, max_heavy_wait=600):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_heavy = max_heavy
+        self.heavy_threshold = heavy_threshold
+        self.max_cost = max_cost
+        self.max_queued = max_queued
+        self.max_heavy_wait = max_heavy_wait
+
+        self._lanes = {lane: deque() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+
+    def classify(self, cost):
+        """Return the lane a job of the given cost belongs to."""
+        return "heavy" if cost >= self.heavy_threshold else "interactive"
+
+    def submit(self, job_id, request, cost):
+        """
+        Admit a job into its lane. Raises AdmissionError if the job is over
+        budget or the queue is full.
+        """
+        if cost > self.max_cost:
+            raise AdmissionError(
+                f"Request is too expensive to render (cost {cost:.1f}, limit {self.max_cost:.1f}). "
+                "Reduce the distance, DPI, poster size or disable buildings."
+            )
+
+        if self.queued() >= self.max_queued:
+            raise AdmissionError("Render queue is full, please try again shortly", status_code=503)
+
+        lane = self.classify(cost)
+        self._lanes[lane].append((job_id, request, time.monotonic()))
+        self._wakeup.set()
+        return lane
+
+    def remove(self, job_id):
+        """Drop a queued job. Returns True if it was still waiting."""
+        for queue in self._lanes.values():
+            for entry in queue:
+                if entry[0] == job_id:
+                    queue.remove(entry)
+                    return True
+        return False
+
+    def queued(self):
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def idle(self):
+        """True when no job is queued or running."""
+        return self.queued() == 0 and sum(self._running.values()) == 0
+
+    def position(self, job_id):
+        """1-based position of a queued job within its lane, or None."""
+        for queue in self._lanes.values():
+            for index, entry in enumerate(queue):
+                if entry[0] == job_id:
+                    return index + 1
+        return None
+
+    def stats(self):
+        return {
+            "queued": {lane: len(queue) for lane, queue in self._lanes.items()},
+            "running": dict(self._running),
+            "max_workers": self.max_workers,
+            "max_heavy": self.max_heavy,
+        }
+
+    def _next_lane(self):
+        """Pick the lane to dispatch from, or None if nothing can run now."""
+        if sum(self._running.values()) >= self.max_workers:
+            return None
+
+        heavy = self._lanes["heavy"]
+        heavy_allowed = heavy and self._running["heavy"] < self.max_heavy
+
+        # Promote heavy jobs that have been waiting too long
+        if heavy_allowed and time.monotonic() - heavy[0][2] > self.max_heavy_wait:
+            return "heavy"
+        if self._lanes["interactive"]:
+            return "interactive"
+        if heavy_allowed:
+            return "heavy"
+        return None
+
+    async def _run_job(self, lane, job_id, request):
+        try:
+            await self.runner(job_id, request)
+        finally:
+            self._running[lane] -= 1
+            self._wakeup.set()
+
+    async def run(self):
+        """Dispatch loop. Start once with asyncio.create_task on app startup."""
+        while True:
+            lane = self._next_lane()
+            if lane is None:
+                self._wakeup.clear()
+                # Wake periodically so aged heavy jobs get promoted
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, request, _ = self._lanes[lane].popleft()
+            self._running[lane] += 1
+            task = asyncio.create_task(self._run_job(lane, job_id, request))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
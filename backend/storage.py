@@ -0,0 +1,146 @@
+"""
+Output store for generated posters.
+
+Outputs are written once and never modified, so each file gets a strong ETag
+(SHA-256 of its contents). The render worker computes it with file_etag, so
+registering an output never reads it on the event loop. A directory of
+outputs, such as a tile pyramid, is stored and expires as one entry. Expiry is
+tracked in a min-heap keyed on expiry time, which makes cleanup proportional
+to the number of expired files instead of the number of stored files.
+
+Each job writes into a directory of its own that is reserved in the index
+before the job starts, so whatever a job that never completes leaves behind
+expires with the directory. Only leftovers of an earlier process need a scan of
+the whole store, see sweep_orphans.
+"""
+import hashlib
+import heapq
+import os
+import shutil
+import threading
+import time
+
+
+class OutputStore:
+    """Index of stored poster files with expiry and ETag metadata."""
+
+    def __init__(self, directory, ttl_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._files = {}  # path -> {"etag", "size", "mtime", "expires_at"}; no etag or size for directories
+        self._expiry = []  # heap of (expires_at, path)
+
+    def register(self, path, created_at=None, etag=None):
+        """
+        Add a finished output file or directory to the index. Returns its
+        metadata. Files are hashed here unless their `etag` is given.
+        """
+        stat = os.stat(path)
+        created_at = created_at if created_at is not None else time.time()
+        if os.path.isdir(path):
+            # Files inside are served with validators and sizes of their own. A
+            # tile pyramid holds tens of thousands of them, too many to stat here
+            etag = size = None
+        else:
+            etag = etag or file_etag(path)
+            size = stat.st_size
+        return self._index(path, {
+            "etag": etag,
+            "size": size,
+            "mtime": stat.st_mtime,
+            "expires_at": created_at + self.ttl_seconds,
+        })
+
+    def reserve(self, directory, expires_at):
+        """
+        Create and index the output directory of a job about to run, so that
+        everything the job writes there is deleted at `expires_at` even if
+        the job never completes. Reserving it again moves the expiry.
+        """
+        os.makedirs(directory, exist_ok=True)
+        return self._index(directory, {"etag": None, "size": None, "mtime": time.time(), "expires_at": expires_at})
+
+    def _index(self, path, entry):
+        with self._lock:
+            self._files[path] = entry
+            heapq.heappush(self._expiry, (entry["expires_at"], path))
+        return entry
+
+    def remove(self, path):
+        """Delete an output or reserved directory now, e.g. that of a failed job."""
+        with self._lock:
+            self._files.pop(path, None)
+        remove_output(path)
+
+    def sweep_orphans(self, now=None):
+        """
+        Delete unindexed outputs older than the expiry time, i.e. those of a
+        process that stopped before they expired. Scans the whole directory,
+        so it runs once at startup. Returns how many were removed.
+        """
+        cutoff = (now if now is not None else time.time()) - self.ttl_seconds
+        orphans = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if mtime <= cutoff:
+                    orphans.append(entry.path)
+
+        with self._lock:
+            orphans = [path for path in orphans if path not in self._files]
+        for path in orphans:
+            remove_output(path)
+        return len(orphans)
+
+    def get(self, path):
+        """Metadata for a stored file, or None if it is unknown or expired."""
+        with self._lock:
+            entry = self._files.get(path)
+        if entry is None or entry["expires_at"] <= time.time():
+            return None
+        return entry
+
+    def expire(self, now=None):
+        """Delete every file whose expiry time has passed. Returns how many were removed."""
+        now = now if now is not None else time.time()
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, path = heapq.heappop(self._expiry)
+                entry = self._files.get(path)
+                # Skip stale heap entries for files that were re-registered
+                if entry is None or entry["expires_at"] != expires_at:
+                    continue
+                del self._files[path]
+                expired.append(path)
+
+        for path in expired:
+            remove_output(path)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._files)
+
+
+def file_etag(path):
+    """Strong ETag of a file: the quoted SHA-256 of its contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()}"'
+
+
+def remove_output(path):
+    """Delete an output file or directory, if it still exists."""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -1,20 +1,43 @@
-import osmnx as ox
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-import matplotlib.colors as mcolors
-import numpy as np
-from geopy.geocoders import Nominatim
-from tqdm import tqdm
 import time
 import json
+import math
 import os
 from datetime import datetime
+from functools import lru_cache
 import argparse
 
+# osmnx, matplotlib, numpy, shapely and geopy take seconds to import, so they
+# are imported inside the functions that need them. Commands such as
+# --list-themes never pay for them, and a process that has imported them once
+# (e.g. a backend render worker) reuses the loaded modules.
+
 THEMES_DIR = "themes"
 FONTS_DIR = "fonts"
 POSTERS_DIR = "posters"
 
+# Radii above this are fetched and drawn chunk by chunk to bound fetch memory. Well
+# above the default radius (29000 m): chunking costs several times the Overpass
+# queries, so it is only for the largest maps
+CHUNKED_FETCH_DISTANCE = int(os.environ.get("CHUNKED_FETCH_DISTANCE", "40000"))
+FETCH_CHUNK_SIZE = 20000  # Edge length of one chunk in meters
+
+FEATURE_TAGS = {
+    'water': {'natural': 'water', 'waterway': 'riverbank'},
+    'parks': {'leisure': 'park', 'landuse': 'grass'},
+    'buildings': {'building': True},
+    'railways': {'railway': 'rail'},
+}
+
+# Upstream services. Unset means the public Nominatim and Overpass instances;
+# point them at a local stand-in (see loadtest/) to run without network access.
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL")  # e.g. http://localhost:8090/nominatim
+OVERPASS_URL = os.environ.get("OVERPASS_URL")  # e.g. http://localhost:8090/overpass
+OSMNX_USE_CACHE = os.environ.get("OSMNX_USE_CACHE", "1") != "0"
+
+# Geocoding results are cached on disk next to osmnx's HTTP cache, so a city
+# that has been seen before needs no network round trip at all ("" disables)
+GEOCODE_CACHE_FILE = os.environ.get("GEOCODE_CACHE_FILE", os.path.join("cache", "geocode.json"))
+
 def load_fonts():
     """
     Load Roboto fonts from the fonts directory.
@@ -36,6 +59,32 @@ def load_fonts():
 
 FONTS = load_fonts()
 
+@lru_cache(maxsize=1)
+def get_poster_fonts():
+    """
+    Returns the FontProperties used for poster typography, keyed by role.
+    Created once per process; building them initialises matplotlib's font manager.
+    """
+    from matplotlib.font_manager import FontProperties
+
+    if FONTS:
+        return {
+            'main': FontProperties(fname=FONTS['bold'], size=60),
+            'top': FontProperties(fname=FONTS['bold'], size=40),
+            'sub': FontProperties(fname=FONTS['light'], size=22),
+            'coords': FontProperties(fname=FONTS['regular'], size=14),
+            'attr': FontProperties(fname=FONTS['light'], size=8),
+        }
+
+    # Fallback to system fonts
+    return {
+        'main': FontProperties(family='monospace', weight='bold', size=60),
+        'top': FontProperties(family='monospace', weight='bold', size=40),
+        'sub': FontProperties(family='monospace', weight='normal', size=22),
+        'coords': FontProperties(family='monospace', size=14),
+        'attr': FontProperties(family='monospace', size=8),
+    }
+
 def generate_output_filename(city, theme_name):
     """
     Generate unique output filename with city, theme, and datetime.
@@ -97,40 +146,6 @@ def load_theme(theme_name="feature_based"):
 # Load theme (can be changed via command line or input)
 THEME = None  # Will be loaded later
 
-def create_gradient_fade(ax, color, location='bottom', zorder=10):
-    """
-    Creates a fade effect at the top or bottom of the map.
-    """
-    vals = np.linspace(0, 1, 256).reshape(-1, 1)
-    gradient = np.hstack((vals, vals))
-    
-    rgb = mcolors.to_rgb(color)
-    my_colors = np.zeros((256, 4))
-    my_colors[:, 0] = rgb[0]
-    my_colors[:, 1] = rgb[1]
-    my_colors[:, 2] = rgb[2]
-    
-    if location == 'bottom':
-        my_colors[:, 3] = np.linspace(1, 0, 256)
-        extent_y_start = 0
-        extent_y_end = 0.25
-    else:
-        my_colors[:, 3] = np.linspace(0, 1, 256)
-        extent_y_start = 0.75
-        extent_y_end = 1.0
-
-    custom_cmap = mcolors.ListedColormap(my_colors)
-    
-    xlim = ax.get_xlim()
-    ylim = ax.get_ylim()
-    y_range = ylim[1] - ylim[0]
-    
-    y_bottom = ylim[0] + y_range * extent_y_start
-    y_top = ylim[0] + y_range * extent_y_end
-    
-    ax.imshow(gradient, extent=[xlim[0], xlim[1], y_bottom, y_top], 
-              aspect='auto', cmap=custom_cmap, zorder=zorder, origin='lower')
-
 def get_edge_colors_by_type(G):
     """
     Assigns colors to edges based on road type hierarchy.
@@ -193,29 +208,253 @@ def get_edge_widths_by_type(G):
     
     return edge_widths
 
+def road_lines(G):
+    """
+    The street network as prepared geometry: one vertex array per edge plus
+    its road hierarchy color and width.
+    """
+    import osmnx as ox
+    from renderers import prepare_lines
+    edges = ox.graph_to_gdfs(G, nodes=False, fill_edge_geometry=True)
+    return prepare_lines(edges.geometry.values), get_edge_colors_by_type(G), get_edge_widths_by_type(G)
+
+def draw_roads(renderer, G, zorder=3):
+    """Draws the street network using the road hierarchy colors and widths."""
+    if G is None or G.number_of_edges() == 0:
+        return
+    lines, colors, widths = road_lines(G)
+    renderer.stroke_lines(lines, colors, widths, zorder=zorder)
+
+def draw_polygons(renderer, gdf, color, zorder, alpha=1.0):
+    """Fills the polygons of a GeoDataFrame. Point and line features are ignored."""
+    from renderers import prepare_polygons
+    if gdf is None or gdf.empty:
+        return
+    polygons = prepare_polygons(gdf.geometry.values)
+    if polygons is not None:
+        renderer.fill_polygons(polygons, color, zorder=zorder, alpha=alpha)
+
+def draw_feature_layer(renderer, layer, gdf):
+    """Draws one optional map layer ('water', 'parks', 'buildings' or 'railways') with theme colors."""
+    from renderers import prepare_lines
+    if layer == 'water':
+        draw_polygons(renderer, gdf, THEME['water'], zorder=1)
+    elif layer == 'parks':
+        draw_polygons(renderer, gdf, THEME['parks'], zorder=2)
+    elif layer == 'buildings':
+        draw_polygons(renderer, gdf, THEME.get('building', '#D0D0D0'), zorder=2.5, alpha=0.5)
+    elif layer == 'railways' and gdf is not None and not gdf.empty:
+        lines = prepare_lines(gdf.geometry.values)
+        if lines:
+            color = THEME.get('railway', '#888888')
+            renderer.stroke_lines(lines, [color] * len(lines), [0.5] * len(lines), zorder=2.7)
+
+def draw_feature_layers(renderer, water=None, parks=None, buildings=None, railways=None):
+    """Draws the optional map layers with theme colors, below the roads."""
+    for layer, gdf in (('water', water), ('parks', parks), ('buildings', buildings), ('railways', railways)):
+        draw_feature_layer(renderer, layer, gdf)
+
+def draw_map(renderer, G, water=None, parks=None, buildings=None, railways=None):
+    """
+    Draws a fully fetched map. The roads sit at zorder 1, where ox.plot_graph
+    used to draw them: above water, below the other feature layers.
+    """
+    draw_feature_layer(renderer, 'water', water)
+    draw_roads(renderer, G, zorder=1)
+    for layer, gdf in (('parks', parks), ('buildings', buildings), ('railways', railways)):
+        draw_feature_layer(renderer, layer, gdf)
+
+def graph_view(G):
+    """The view ox.plot_graph frames a graph to: the edges' bounds plus 2% padding."""
+    import osmnx as ox
+    west, south, east, north = ox.graph_to_gdfs(G, nodes=False)["geometry"].total_bounds
+    pad_x, pad_y = (east - west) * 0.02, (north - south) * 0.02
+    return (west - pad_x, south - pad_y, east + pad_x, north + pad_y)
+
+def draw_poster_text(renderer, city, country, point, show_attribution=True):
+    """Gradient fades, city name, country, coordinates and attribution."""
+    # Gradients (Top and Bottom)
+    renderer.gradient(THEME['gradient_color'], location='bottom', zorder=10)
+    renderer.gradient(THEME['gradient_color'], location='top', zorder=10)
+
+    # Typography using Roboto font
+    fonts = get_poster_fonts()
+    spaced_city = "  ".join(list(city.upper()))
+
+    # --- BOTTOM TEXT ---
+    renderer.text(0.5, 0.14, spaced_city, fonts['main'], THEME['text'], zorder=11)
+    renderer.text(0.5, 0.10, country.upper(), fonts['sub'], THEME['text'], zorder=11)
+
+    lat, lon = point
+    coords = f"{lat:.4f}° N / {lon:.4f}° E" if lat >= 0 else f"{abs(lat):.4f}° S / {lon:.4f}° E"
+    if lon < 0:
+        coords = coords.replace("E", "W")
+    renderer.text(0.5, 0.07, coords, fonts['coords'], THEME['text'], zorder=11, alpha=0.7)
+    renderer.rule(0.4, 0.6, 0.125, THEME['text'], width=1, zorder=11)
+
+    # --- ATTRIBUTION (bottom right) ---
+    if show_attribution:
+        renderer.text(0.98, 0.02, "powered by arun.im", fonts['attr'], THEME['text'], zorder=11,
+                      alpha=0.4, ha='right', va='bottom')
+
+def map_bbox(point, dist):
+    """(west, south, east, north) of the square of half-width dist around point."""
+    lat, lon = point
+    dlat = dist / 111320
+    dlon = dist / (111320 * math.cos(math.radians(lat)))
+    return (lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+
+def chunk_bboxes(point, dist, chunk_size=FETCH_CHUNK_SIZE):
+    """Splits the map square into a grid of equally sized (west, south, east, north) chunks."""
+    west, south, east, north = map_bbox(point, dist)
+    n = max(1, math.ceil(2 * dist / chunk_size))
+    xs = [west + (east - west) * i / n for i in range(n + 1)]
+    ys = [south + (north - south) * j / n for j in range(n + 1)]
+    return [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for j in range(n) for i in range(n)]
+
+def fetch_chunk(bbox, layers=('water', 'parks')):
+    """
+    Fetches the street network and feature layers of one chunk.
+    Returns (G, {layer: GeoDataFrame}); G is None if the chunk has no streets.
+    """
+    import osmnx as ox
+    try:
+        # truncate_by_edge keeps roads crossing the chunk border, retain_all keeps
+        # pieces that are only disconnected because of the cut
+        G = ox.graph_from_bbox(bbox, network_type='all', truncate_by_edge=True, retain_all=True)
+    except ValueError:
+        G = None  # No streets in this chunk (e.g. open water)
+
+    features = {}
+    for layer in layers:
+        try:
+            features[layer] = ox.features_from_bbox(bbox, tags=FEATURE_TAGS[layer])
+        except Exception:
+            continue
+    return G, features
+
+def _border_edges(G, bbox):
+    """(u, v, key) of the edges with an end outside bbox, i.e. those crossing the chunk border."""
+    west, south, east, north = bbox
+    outside = {
+        node for node, data in G.nodes(data=True)
+        if not (west <= data['x'] <= east and south <= data['y'] <= north)
+    }
+    return {(u, v, key) for u, v, key in G.edges(keys=True) if u in outside or v in outside}
+
+def draw_map_chunked(renderer, point, dist, layers=('water', 'parks'), chunk_size=FETCH_CHUNK_SIZE, on_chunk=None):
+    """
+    Fetches and draws the map one spatial chunk at a time. Each chunk's graph
+    and GeoDataFrames are converted to compact geometry arrays, drawn, and
+    released before the next chunk is fetched. This bounds the fetch and parse
+    memory to one chunk. The drawn geometry of every chunk is still held by the
+    renderer until the poster is saved, so that part grows with the whole area.
+
+    on_chunk(done, total) is called after each chunk. Returns the number of
+    street edges drawn.
+    """
+    chunks = chunk_bboxes(point, dist, chunk_size)
+    # Features straddling chunks come back more than once. Kept per layer: a
+    # feature in two layers (a park tagged as water) is drawn in both, as in draw_map
+    seen_features = {layer: set() for layer in layers}
+    seen_border_edges = set()  # So do edges crossing a chunk border (truncate_by_edge)
+    edge_count = 0
+
+    for done, bbox in enumerate(chunks, start=1):
+        G, features = fetch_chunk(bbox, layers)
+        for layer, gdf in features.items():
+            gdf = gdf[~gdf.index.isin(seen_features[layer])]
+            seen_features[layer].update(gdf.index)
+            features[layer] = gdf
+
+        if G is not None:
+            border_edges = _border_edges(G, bbox)
+            G.remove_edges_from(border_edges & seen_border_edges)
+            seen_border_edges.update(border_edges)
+
+        draw_feature_layers(renderer, **features)
+        draw_roads(renderer, G, zorder=1)  # Same stacking as draw_map
+        if G is not None:
+            edge_count += G.number_of_edges()
+
+        G = features = gdf = None
+        if on_chunk:
+            on_chunk(done, len(chunks))
+
+    return edge_count
+
+def configure_upstreams():
+    """
+    Applies the OVERPASS_URL and OSMNX_USE_CACHE overrides to osmnx.
+    osmnx settings are per process, so call this once before fetching.
+    """
+    import osmnx as ox
+    if OVERPASS_URL:
+        ox.settings.overpass_url = OVERPASS_URL
+    ox.settings.use_cache = OSMNX_USE_CACHE
+
+def _geocode_key(city, country):
+    return f"{city.strip().lower()}|{country.strip().lower()}"
+
+def _read_geocode_cache():
+    if not GEOCODE_CACHE_FILE or not os.path.exists(GEOCODE_CACHE_FILE):
+        return {}
+    try:
+        with open(GEOCODE_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_geocode_cache(city, country, lat, lon, address):
+    """Adds one result to the geocode cache. Concurrent writers may drop an entry, never corrupt the file."""
+    if not GEOCODE_CACHE_FILE:
+        return
+    cache = _read_geocode_cache()
+    cache[_geocode_key(city, country)] = [lat, lon, address]
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(GEOCODE_CACHE_FILE)), exist_ok=True)
+        tmp_file = f"{GEOCODE_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, GEOCODE_CACHE_FILE)
+    except OSError as e:
+        print(f"⚠ Could not write geocode cache: {e}")
+
 def get_coordinates(city, country):
     """
     Fetches coordinates for a given city and country using geopy.
     Includes rate limiting to be respectful to the geocoding service.
+    Results are cached in GEOCODE_CACHE_FILE.
     """
+    cached = _read_geocode_cache().get(_geocode_key(city, country))
+    if cached:
+        print(f"✓ Found (cached): {cached[2]}")
+        return (cached[0], cached[1])
+
+    from geopy.geocoders import Nominatim
     print("Looking up coordinates...")
-    geolocator = Nominatim(user_agent="city_map_poster")
-    
-    # Add a small delay to respect Nominatim's usage policy
-    time.sleep(1)
+    if NOMINATIM_URL:
+        scheme, _, domain = NOMINATIM_URL.partition("://")
+        geolocator = Nominatim(user_agent="city_map_poster", domain=domain, scheme=scheme)
+    else:
+        geolocator = Nominatim(user_agent="city_map_poster")
+        # Add a small delay to respect Nominatim's usage policy
+        time.sleep(1)
     
     location = geolocator.geocode(f"{city}, {country}")
     
     if location:
         print(f"✓ Found: {location.address}")
         print(f"✓ Coordinates: {location.latitude}, {location.longitude}")
+        _write_geocode_cache(city, country, location.latitude, location.longitude, location.address)
         return (location.latitude, location.longitude)
     else:
         raise ValueError(f"Could not find coordinates for {city}, {country}")
 
-def create_poster(city, country, point, dist, output_file):
-    print(f"\nGenerating map for {city}, {country}...")
-    
+def _fetch_map(point, dist):
+    """Fetches the street network, water and parks of the whole area at once."""
+    import osmnx as ox
+    from tqdm import tqdm
     # Progress bar for data fetching
     with tqdm(total=3, desc="Fetching map data", unit="step", bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}') as pbar:
         # 1. Fetch Street Network
@@ -227,7 +466,7 @@ def create_poster(city, country, point, dist, output_file):
         # 2. Fetch Water Features
         pbar.set_description("Downloading water features")
         try:
-            water = ox.features_from_point(point, tags={'natural': 'water', 'waterway': 'riverbank'}, dist=dist)
+            water = ox.features_from_point(point, tags=FEATURE_TAGS['water'], dist=dist)
         except:
             water = None
         pbar.update(1)
@@ -236,90 +475,44 @@ def create_poster(city, country, point, dist, output_file):
         # 3. Fetch Parks
         pbar.set_description("Downloading parks/green spaces")
         try:
-            parks = ox.features_from_point(point, tags={'leisure': 'park', 'landuse': 'grass'}, dist=dist)
+            parks = ox.features_from_point(point, tags=FEATURE_TAGS['parks'], dist=dist)
         except:
             parks = None
         pbar.update(1)
     
     print("✓ All data downloaded successfully!")
-    
-    # 2. Setup Plot
-    print("Rendering map...")
-    fig, ax = plt.subplots(figsize=(12, 16), facecolor=THEME['bg'])
-    ax.set_facecolor(THEME['bg'])
-    ax.set_position([0, 0, 1, 1])
-    
-    # 3. Plot Layers
-    # Layer 1: Polygons
-    if water is not None and not water.empty:
-        water.plot(ax=ax, facecolor=THEME['water'], edgecolor='none', zorder=1)
-    if parks is not None and not parks.empty:
-        parks.plot(ax=ax, facecolor=THEME['parks'], edgecolor='none', zorder=2)
-    
-    # Layer 2: Roads with hierarchy coloring
-    print("Applying road hierarchy colors...")
-    edge_colors = get_edge_colors_by_type(G)
-    edge_widths = get_edge_widths_by_type(G)
-    
-    ox.plot_graph(
-        G, ax=ax, bgcolor=THEME['bg'],
-        node_size=0,
-        edge_color=edge_colors,
-        edge_linewidth=edge_widths,
-        show=False, close=False
-    )
-    
-    # Layer 3: Gradients (Top and Bottom)
-    create_gradient_fade(ax, THEME['gradient_color'], location='bottom', zorder=10)
-    create_gradient_fade(ax, THEME['gradient_color'], location='top', zorder=10)
-    
-    # 4. Typography using Roboto font
-    if FONTS:
-        font_main = FontProperties(fname=FONTS['bold'], size=60)
-        font_top = FontProperties(fname=FONTS['bold'], size=40)
-        font_sub = FontProperties(fname=FONTS['light'], size=22)
-        font_coords = FontProperties(fname=FONTS['regular'], size=14)
-    else:
-        # Fallback to system fonts
-        font_main = FontProperties(family='monospace', weight='bold', size=60)
-        font_top = FontProperties(family='monospace', weight='bold', size=40)
-        font_sub = FontProperties(family='monospace', weight='normal', size=22)
-        font_coords = FontProperties(family='monospace', size=14)
-    
-    spaced_city = "  ".join(list(city.upper()))
+    return G, water, parks
 
-    # --- BOTTOM TEXT ---
-    ax.text(0.5, 0.14, spaced_city, transform=ax.transAxes,
-            color=THEME['text'], ha='center', fontproperties=font_main, zorder=11)
-    
-    ax.text(0.5, 0.10, country.upper(), transform=ax.transAxes,
-            color=THEME['text'], ha='center', fontproperties=font_sub, zorder=11)
-    
-    lat, lon = point
-    coords = f"{lat:.4f}° N / {lon:.4f}° E" if lat >= 0 else f"{abs(lat):.4f}° S / {lon:.4f}° E"
-    if lon < 0:
-        coords = coords.replace("E", "W")
-    
-    ax.text(0.5, 0.07, coords, transform=ax.transAxes,
-            color=THEME['text'], alpha=0.7, ha='center', fontproperties=font_coords, zorder=11)
-    
-    ax.plot([0.4, 0.6], [0.125, 0.125], transform=ax.transAxes, 
-            color=THEME['text'], linewidth=1, zorder=11)
+def create_poster(city, country, point, dist, output_file, renderer='matplotlib'):
+    from tqdm import tqdm
+    from renderers import create_renderer
+    print(f"\nGenerating map for {city}, {country}...")
 
-    # --- ATTRIBUTION (bottom right) ---
-    if FONTS:
-        font_attr = FontProperties(fname=FONTS['light'], size=8)
+    if dist > CHUNKED_FETCH_DISTANCE:
+        # Large radius: fetch and draw chunk by chunk to bound the fetch memory
+        poster = create_renderer(renderer, 12, 16, 300, map_bbox(point, dist), THEME['bg'])
+
+        total_chunks = len(chunk_bboxes(point, dist))
+        print(f"Large radius, fetching in {total_chunks} chunks...")
+        with tqdm(total=total_chunks, desc="Fetching & drawing chunks", unit="chunk") as pbar:
+            draw_map_chunked(poster, point, dist, on_chunk=lambda done, total: pbar.update(1))
+        print("✓ All data downloaded successfully!")
     else:
-        font_attr = FontProperties(family='monospace', size=8)
-    
-    ax.text(0.98, 0.02, "powered by arun.im", transform=ax.transAxes,
-            color=THEME['text'], alpha=0.4, ha='right', va='bottom', 
-            fontproperties=font_attr, zorder=11)
+        G, water, parks = _fetch_map(point, dist)
 
-    # 5. Save
+        # Frame the map the way ox.plot_graph would, stretched over the whole poster
+        print("Rendering map...")
+        poster = create_renderer(renderer, 12, 16, 300, graph_view(G), THEME['bg'])
+        print("Applying road hierarchy colors...")
+        draw_map(poster, G, water=water, parks=parks)
+
+    # Gradients and typography
+    draw_poster_text(poster, city, country, point)
+
+    # Save
     print(f"Saving to {output_file}...")
-    plt.savefig(output_file, dpi=300, facecolor=THEME['bg'])
-    plt.close()
+    poster.save(output_file, 'png')
+    poster.close()
     print(f"✓ Done! Poster saved as {output_file}")
 
 def print_examples():
@@ -367,6 +560,7 @@ Options:
   --country, -C     Country name (required)
   --theme, -t       Theme name (default: feature_based)
   --distance, -d    Map radius in meters (default: 29000)
+  --renderer, -r    matplotlib (default) or raster (faster, PNG only)
   --list-themes     List all available themes
 
 Distance guide:
@@ -404,6 +598,8 @@ def list_themes():
         print()
 
 if __name__ == "__main__":
+    from renderers import RENDERERS
+
     parser = argparse.ArgumentParser(
         description="Generate beautiful map posters for any city",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -420,6 +616,8 @@ Examples:
     parser.add_argument('--country', '-C', type=str, help='Country name')
     parser.add_argument('--theme', '-t', type=str, default='feature_based', help='Theme name (default: feature_based)')
     parser.add_argument('--distance', '-d', type=int, default=29000, help='Map radius in meters (default: 29000)')
+    parser.add_argument('--renderer', '-r', type=str, default='matplotlib', choices=RENDERERS,
+                        help='Drawing backend: matplotlib (reference) or raster (faster, PNG only)')
     parser.add_argument('--list-themes', action='store_true', help='List all available themes')
     
     args = parser.parse_args()
@@ -456,9 +654,10 @@ Examples:
     
     # Get coordinates and generate poster
     try:
+        configure_upstreams()
         coords = get_coordinates(args.city, args.country)
         output_file = generate_output_filename(args.city, args.theme)
-        create_poster(args.city, args.country, coords, args.distance, output_file)
+        create_poster(args.city, args.country, coords, args.distance, output_file, renderer=args.renderer)
         
         print("\n" + "=" * 50)
         print("✓ Poster generation complete!")
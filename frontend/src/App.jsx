@@ -11,11 +11,14 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from "./components/ui/tabs"
 import { ScrollArea } from "./components/ui/scroll-area"
 import { ThemeCard } from './components/ThemeCard'
 import { ProgressTracker } from './components/ProgressTracker'
+import { DeepZoomViewer } from './components/DeepZoomViewer'
 import { Map, Download, Settings2, Sparkles, Image as ImageIcon, Loader2 } from 'lucide-react'
 
 // Configure axios defaults
 axios.defaults.timeout = 30000
 
+const FINISHED_STATES = ['completed', 'failed', 'cancelled']
+
 function App() {
   const [city, setCity] = useState('')
   const [country, setCountry] = useState('')
@@ -37,16 +40,20 @@ function App() {
   const [showRailways, setShowRailways] = useState(false)
   const [showAttribution, setShowAttribution] = useState(true)
   const [format, setFormat] = useState('png')
+  const [zoomablePreview, setZoomablePreview] = useState(true)
   const [aspectRatios, setAspectRatios] = useState([])
   const [formatOptions, setFormatOptions] = useState([])
+  const [estimate, setEstimate] = useState(null)
 
   useEffect(() => {
     fetchThemes()
     fetchPresets()
   }, [])
 
+  const isJobActive = jobId && jobStatus && !FINISHED_STATES.includes(jobStatus.status)
+
   useEffect(() => {
-    if (jobId && jobStatus?.status !== 'completed' && jobStatus?.status !== 'failed') {
+    if (isJobActive) {
       const interval = setInterval(() => {
         checkJobStatus(jobId)
       }, 2000)
@@ -54,6 +61,60 @@ function App() {
     }
   }, [jobId, jobStatus])
 
+  useEffect(() => {
+    if (!isJobActive) return
+    // Nobody will collect the poster once the page is gone; free the worker
+    const cancelOnExit = () => {
+      fetch(`/api/job/${jobId}`, { method: 'DELETE', keepalive: true })
+    }
+    window.addEventListener('pagehide', cancelOnExit)
+    return () => window.removeEventListener('pagehide', cancelOnExit)
+  }, [jobId, isJobActive])
+
+  useEffect(() => {
+    if (!city || !country) {
+      setEstimate(null)
+      return
+    }
+    // Debounce so typing doesn't fire a request per keystroke
+    const timeout = setTimeout(() => {
+      fetchEstimate()
+    }, 500)
+    return () => clearTimeout(timeout)
+  }, [city, country, distance, width, height, dpi, format, showWater, showParks, showBuildings, showRailways])
+
+  const buildRequest = () => ({
+    city,
+    country,
+    theme,
+    distance: distance[0],
+    width,
+    height,
+    dpi,
+    format,
+    // Tiles are cut from the PNG, so SVG-only posters preview as a plain image
+    tiles: zoomablePreview && format !== 'svg',
+    show_water: showWater,
+    show_parks: showParks,
+    show_buildings: showBuildings,
+    show_railways: showRailways,
+    show_attribution: showAttribution
+  })
+
+  const fetchEstimate = async () => {
+    try {
+      const response = await axios.post('/api/estimate', buildRequest(), { timeout: 10000 })
+      setEstimate(response.data)
+    } catch (error) {
+      setEstimate(null)
+    }
+  }
+
+  const formatDuration = (seconds) => {
+    if (seconds < 60) return `~${Math.max(1, Math.round(seconds))}s`
+    return `~${Math.round(seconds / 60)} min`
+  }
+
   const fetchThemes = async () => {
     try {
       const response = await axios.get('/api/themes', { timeout: 10000 })
@@ -73,6 +134,19 @@ function App() {
     }
   }
 
+  const cancelJob = async () => {
+    if (!jobId) return
+    try {
+      await axios.delete(`/api/job/${jobId}`, { timeout: 10000 })
+    } catch (error) {
+      // Already finished: nothing left to cancel
+      console.error('Error cancelling job:', error)
+    }
+    setJobId(null)
+    setJobStatus(null)
+    setLoading(false)
+  }
+
   const generatePoster = async (e) => {
     if (e) e.preventDefault()
     setLoading(true)
@@ -80,21 +154,7 @@ function App() {
     setGeneratedImage(null)
 
     try {
-      const response = await axios.post('/api/generate', {
-        city,
-        country,
-        theme,
-        distance: distance[0],
-        width,
-        height,
-        dpi,
-        format,
-        show_water: showWater,
-        show_parks: showParks,
-        show_buildings: showBuildings,
-        show_railways: showRailways,
-        show_attribution: showAttribution
-      }, { timeout: 30000 })
+      const response = await axios.post('/api/generate', buildRequest(), { timeout: 30000 })
       setJobId(response.data.job_id)
       setJobStatus(response.data)
     } catch (error) {
@@ -116,6 +176,9 @@ function App() {
         alert('Poster generation failed: ' + response.data.message)
         setLoading(false)
         setJobId(null)
+      } else if (response.data.status === 'cancelled') {
+        setLoading(false)
+        setJobId(null)
       }
     } catch (error) {
       console.error('Error checking job status:', error)
@@ -343,6 +406,17 @@ function App() {
                       </div>
                     ))}
                   </div>
+                  <div className="flex items-center space-x-2">
+                    <Checkbox
+                      id="zoomable-preview"
+                      checked={zoomablePreview && format !== 'svg'}
+                      disabled={format === 'svg'}
+                      onCheckedChange={setZoomablePreview}
+                    />
+                    <label htmlFor="zoomable-preview" className="text-xs font-medium cursor-pointer">
+                      Zoomable preview (loads only the visible tiles)
+                    </label>
+                  </div>
                 </div>
 
                 {/* Map Features */}
@@ -381,6 +455,11 @@ function App() {
           </ScrollArea>
 
           <footer className="p-6 border-t border-border bg-card">
+            {estimate && (
+              <p className="text-[10px] text-muted-foreground uppercase tracking-widest text-center mb-3">
+                Est. {formatDuration(estimate.duration_seconds)} · {estimate.output_size_mb.toFixed(1)} MB
+              </p>
+            )}
             <Button
               className="w-full h-12 text-sm font-bold shadow-lg shadow-primary/20 transition-all hover:scale-[1.02] active:scale-[0.98]"
               disabled={loading || !city || !country}
@@ -432,17 +511,32 @@ function App() {
                   </CardHeader>
                   <CardContent className="p-8">
                     <ProgressTracker jobStatus={jobStatus} />
+                    {isJobActive && (
+                      <div className="flex justify-center mt-6">
+                        <Button variant="outline" size="sm" onClick={cancelJob}>
+                          Cancel
+                        </Button>
+                      </div>
+                    )}
                   </CardContent>
                 </Card>
               ) : (
                 <div className="space-y-8 animate-in zoom-in duration-1000">
                   <div className="relative group mx-auto max-h-[70vh] flex justify-center">
-                    <img
-                      src={generatedImage}
-                      alt="Generated poster"
-                      className="rounded-lg shadow-2xl border-8 border-white object-contain"
-                      style={{ height: '70vh' }}
-                    />
+                    {jobStatus.tiles ? (
+                      <DeepZoomViewer
+                        tiles={jobStatus.tiles}
+                        className="rounded-lg shadow-2xl border-8 border-white bg-white"
+                        style={{ height: '70vh', aspectRatio: `${jobStatus.tiles.width} / ${jobStatus.tiles.height}` }}
+                      />
+                    ) : (
+                      <img
+                        src={generatedImage}
+                        alt="Generated poster"
+                        className="rounded-lg shadow-2xl border-8 border-white object-contain"
+                        style={{ height: '70vh' }}
+                      />
+                    )}
                     <div className="absolute inset-0 rounded-lg ring-1 ring-inset ring-black/10 pointer-events-none" />
                   </div>
 
@@ -0,0 +1,223 @@
+import { useEffect, useRef, useState } from 'react'
+import { ZoomIn, ZoomOut, Maximize } from 'lucide-react'
+import { Button } from './ui/button'
+import { cn } from '../lib/utils'
+
+// Zooming stops once one poster pixel covers this many screen pixels
+const MAX_PIXEL_SCALE = 2
+const ZOOM_STEP = 2
+
+// Pixel size of a pyramid level: each level halves the one above, rounding up
+const levelSize = (tiles, level) => {
+  const scale = 2 ** (tiles.max_level - level)
+  return [Math.ceil(tiles.width / scale), Math.ceil(tiles.height / scale)]
+}
+
+// Tiles of `level` that overlap the visible part of the poster, positioned in CSS pixels
+const visibleTiles = (tiles, level, view, viewport) => {
+  const [levelWidth, levelHeight] = levelSize(tiles, level)
+  const toLevel = levelWidth / tiles.width // Poster pixels to level pixels
+  const toScreen = view.scale / toLevel // Level pixels to CSS pixels
+  const { tile_size: size, overlap } = tiles
+  const base = tiles.url.replace(/\.dzi$/, '_files/')
+
+  const first = (offset) => Math.max(0, Math.floor((-offset / view.scale) * toLevel / size))
+  const last = (offset, extent, levelExtent) =>
+    Math.min(Math.ceil(levelExtent / size) - 1, Math.floor(((extent - offset) / view.scale) * toLevel / size))
+
+  const result = []
+  for (let col = first(view.x); col <= last(view.x, viewport.width, levelWidth); col++) {
+    for (let row = first(view.y); row <= last(view.y, viewport.height, levelHeight); row++) {
+      // Tiles include `overlap` pixels of their neighbours, except at the edges
+      const left = col * size - (col ? overlap : 0)
+      const top = row * size - (row ? overlap : 0)
+      const right = Math.min((col + 1) * size + overlap, levelWidth)
+      const bottom = Math.min((row + 1) * size + overlap, levelHeight)
+      result.push({
+        key: `${level}/${col}_${row}`,
+        src: `${base}${level}/${col}_${row}.${tiles.format}`,
+        left: view.x + left * toScreen,
+        top: view.y + top * toScreen,
+        width: (right - left) * toScreen,
+        height: (bottom - top) * toScreen,
+      })
+    }
+  }
+  return result
+}
+
+/**
+ * Zoomable poster preview from a deep-zoom tile pyramid (see backend/deepzoom.py).
+ * Only the tiles on screen at the current zoom are loaded; a single low
+ * resolution tile stays underneath while sharper ones arrive.
+ */
+export function DeepZoomViewer({ tiles, className, style }) {
+  const containerRef = useRef(null)
+  const pointers = useRef(new Map())
+  const gesture = useRef(null)
+  const [viewport, setViewport] = useState(null)
+  const [view, setView] = useState(null) // scale: CSS pixels per poster pixel; x, y: poster origin
+
+  const fitScale = viewport ? Math.min(viewport.width / tiles.width, viewport.height / tiles.height) : 1
+  const maxScale = Math.max(fitScale, MAX_PIXEL_SCALE / (window.devicePixelRatio || 1))
+
+  // Keep the poster centred along axes where it is smaller than the viewport, and covering it otherwise
+  const clamp = ({ scale, x, y }) => {
+    scale = Math.min(Math.max(scale, fitScale), maxScale)
+    const bound = (offset, extent, size) =>
+      size <= extent ? (extent - size) / 2 : Math.min(0, Math.max(extent - size, offset))
+    return {
+      scale,
+      x: bound(x, viewport.width, tiles.width * scale),
+      y: bound(y, viewport.height, tiles.height * scale),
+    }
+  }
+
+  const fit = () => setView(clamp({ scale: fitScale, x: 0, y: 0 }))
+
+  // Zoom by `factor` keeping the poster point under (cx, cy) in place
+  const zoomAt = (factor, cx, cy) => {
+    setView((current) => {
+      const scale = Math.min(Math.max(current.scale * factor, fitScale), maxScale)
+      const ratio = scale / current.scale
+      return clamp({ scale, x: cx - (cx - current.x) * ratio, y: cy - (cy - current.y) * ratio })
+    })
+  }
+
+  useEffect(() => {
+    const observer = new ResizeObserver(([entry]) => {
+      setViewport({ width: entry.contentRect.width, height: entry.contentRect.height })
+    })
+    observer.observe(containerRef.current)
+    return () => observer.disconnect()
+  }, [])
+
+  useEffect(() => {
+    if (viewport) fit()
+  }, [viewport, tiles.url])
+
+  // React's onWheel is passive, and the page must not scroll while zooming
+  useEffect(() => {
+    const element = containerRef.current
+    const onWheel = (e) => {
+      e.preventDefault()
+      const rect = element.getBoundingClientRect()
+      zoomAt(Math.exp(-e.deltaY * 0.002), e.clientX - rect.left, e.clientY - rect.top)
+    }
+    element.addEventListener('wheel', onWheel, { passive: false })
+    return () => element.removeEventListener('wheel', onWheel)
+  })
+
+  const localPoint = (e) => {
+    const rect = containerRef.current.getBoundingClientRect()
+    return { x: e.clientX - rect.left, y: e.clientY - rect.top }
+  }
+
+  // One pointer pans, two pinch-zoom around their midpoint
+  const startGesture = () => {
+    const points = [...pointers.current.values()]
+    if (points.length === 1) {
+      gesture.current = { start: points[0], view }
+    } else if (points.length === 2) {
+      const [a, b] = points
+      gesture.current = {
+        distance: Math.hypot(a.x - b.x, a.y - b.y),
+        mid: { x: (a.x + b.x) / 2, y: (a.y + b.y) / 2 },
+        view,
+      }
+    }
+  }
+
+  const onPointerDown = (e) => {
+    containerRef.current.setPointerCapture(e.pointerId)
+    pointers.current.set(e.pointerId, localPoint(e))
+    startGesture()
+  }
+
+  const onPointerMove = (e) => {
+    if (!pointers.current.has(e.pointerId) || !gesture.current) return
+    pointers.current.set(e.pointerId, localPoint(e))
+    const points = [...pointers.current.values()]
+    const start = gesture.current.view
+    if (points.length === 1) {
+      const { x, y } = gesture.current.start
+      setView(clamp({ scale: start.scale, x: start.x + points[0].x - x, y: start.y + points[0].y - y }))
+    } else if (points.length === 2) {
+      const [a, b] = points
+      const { distance, mid } = gesture.current
+      const scale = Math.min(Math.max(start.scale * Math.hypot(a.x - b.x, a.y - b.y) / distance, fitScale), maxScale)
+      const ratio = scale / start.scale
+      const center = { x: (a.x + b.x) / 2, y: (a.y + b.y) / 2 }
+      setView(clamp({ scale, x: center.x - (mid.x - start.x) * ratio, y: center.y - (mid.y - start.y) * ratio }))
+    }
+  }
+
+  const onPointerUp = (e) => {
+    pointers.current.delete(e.pointerId)
+    startGesture()
+  }
+
+  const onDoubleClick = (e) => {
+    const { x, y } = localPoint(e)
+    zoomAt(ZOOM_STEP, x, y)
+  }
+
+  const zoomCenter = (factor) => zoomAt(factor, viewport.width / 2, viewport.height / 2)
+
+  let layers = []
+  if (viewport && view) {
+    // Sharpest level needed for the current zoom on this display, and one that fits in a single tile
+    const dpr = window.devicePixelRatio || 1
+    const level = Math.min(tiles.max_level, Math.max(0, tiles.max_level + Math.ceil(Math.log2(view.scale * dpr))))
+    const backdrop = Math.max(0, tiles.max_level - Math.ceil(Math.log2(Math.max(tiles.width, tiles.height) / tiles.tile_size)))
+    layers = visibleTiles(tiles, Math.min(backdrop, level), view, viewport)
+    if (level > backdrop) {
+      layers = layers.concat(visibleTiles(tiles, level, view, viewport))
+    }
+  }
+
+  return (
+    <div
+      ref={containerRef}
+      className={cn("relative overflow-hidden select-none touch-none cursor-grab active:cursor-grabbing", className)}
+      style={style}
+      onPointerDown={onPointerDown}
+      onPointerMove={onPointerMove}
+      onPointerUp={onPointerUp}
+      onPointerCancel={onPointerUp}
+      onDoubleClick={onDoubleClick}
+    >
+      {layers.map((tile) => (
+        <img
+          key={tile.key}
+          src={tile.src}
+          alt=""
+          draggable={false}
+          className="absolute max-w-none pointer-events-none"
+          style={{ left: tile.left, top: tile.top, width: tile.width, height: tile.height }}
+        />
+      ))}
+
+      {view && (
+        <div
+          className="absolute bottom-3 right-3 flex gap-1"
+          onPointerDown={(e) => e.stopPropagation()}
+          onDoubleClick={(e) => e.stopPropagation()}
+        >
+          <Button variant="secondary" size="icon" className="h-8 w-8" onClick={() => zoomCenter(ZOOM_STEP)}
+            disabled={view.scale >= maxScale} title="Zoom in">
+            <ZoomIn className="w-4 h-4" />
+          </Button>
+          <Button variant="secondary" size="icon" className="h-8 w-8" onClick={() => zoomCenter(1 / ZOOM_STEP)}
+            disabled={view.scale <= fitScale} title="Zoom out">
+            <ZoomOut className="w-4 h-4" />
+          </Button>
+          <Button variant="secondary" size="icon" className="h-8 w-8" onClick={fit}
+            disabled={view.scale <= fitScale} title="Fit poster">
+            <Maximize className="w-4 h-4" />
+          </Button>
+        </div>
+      )}
+    </div>
+  )
+}
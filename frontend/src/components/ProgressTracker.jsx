@@ -95,6 +95,14 @@ export function ProgressTracker({ jobStatus }) {
         })}
       </div>
 
+      {jobStatus.adjustments?.length > 0 && (
+        <div className="bg-muted/30 border border-border/50 rounded-xl p-4">
+          <p className="text-xs text-muted-foreground text-center">
+            Adjusted to fit the memory budget: {jobStatus.adjustments.join(', ')}
+          </p>
+        </div>
+      )}
+
       {isFailed && (
         <div className="bg-destructive/10 border border-destructive/20 rounded-xl p-4 animate-in fade-in slide-in-from-top-2">
           <p className="text-xs text-destructive font-medium text-center">
@@ -0,0 +1,233 @@
+"""
+Job cost estimation learned from historical run metrics.
+
+Every finished render appends one line of metrics (stage timings, peak memory,
+output size, street edge count) to a JSONL history file. The estimator fits a
+small ridge regression per target on that history and uses it to predict
+duration, peak memory and output size for a new request before it runs.
+
+With little or no history the fit is pulled towards hand-tuned prior
+coefficients, so predictions are sensible from the very first request.
+
+Used by the backend's POST /api/estimate and by batch tooling:
+
+  python job_estimator.py jobs.json --workers 4
+"""
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+
+# Street edges per km² when nothing is known about a city (network_type='all')
+DEFAULT_EDGE_DENSITY = 50.0
+
+FEATURE_NAMES = [
+    "intercept",
+    "edges_k",          # Expected street edges, in thousands
+    "png_mpx",          # Raster megapixels written
+    "svg_edges_k",      # Edges serialised to SVG
+    "water_km2_k",      # Map area (1000 km²) for each optional layer
+    "parks_km2_k",
+    "buildings_km2_k",
+    "railways_km2_k",
+]
+
+TARGETS = ["duration_seconds", "peak_memory_mb", "output_size_mb"]
+
+# Prior coefficients per target, in the order of FEATURE_NAMES
+PRIORS = {
+    "duration_seconds": [5.0, 1.0, 0.5, 0.6, 4.0, 5.0, 60.0, 2.0],
+    "peak_memory_mb":   [250.0, 5.0, 8.0, 1.0, 20.0, 25.0, 400.0, 10.0],
+    "output_size_mb":   [0.0, 0.0, 0.3, 0.25, 0.0, 0.0, 0.0, 0.0],
+}
+
+# Strength of the pull towards the priors (in units of samples)
+RIDGE_STRENGTH = 3.0
+
+
+def _slug(city, country):
+    return f"{city.strip().lower()}|{country.strip().lower()}"
+
+
+def area_km2(distance):
+    """Area of the square bounding box fetched for a given radius."""
+    return (2 * distance / 1000) ** 2
+
+
+class JobEstimator:
+    """Predicts job duration, peak memory and output size from past runs."""
+
+    def __init__(self, history_file=None, max_samples=5000):
+        self.history_file = history_file
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = []
+        self._densities = {}
+        self._coefs = None
+        self._load()
+
+    def _load(self):
+        if not self.history_file or not os.path.exists(self.history_file):
+            return
+        with open(self.history_file, 'r') as f:
+            for line in f:
+                try:
+                    self._add(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+
+    def _add(self, sample):
+        self._samples.append(sample)
+        if len(self._samples) > self.max_samples:
+            self._samples = self._samples[-self.max_samples:]
+        edges = sample.get("edge_count")
+        if edges:
+            request = sample["request"]
+            density = edges / area_km2(request["distance"])
+            self._densities[_slug(request["city"], request["country"])] = density
+        self._coefs = None
+
+    def edge_density(self, city=None, country=None):
+        """Known street edge density for a city, else the median of all known cities."""
+        if city and country:
+            density = self._densities.get(_slug(city, country))
+            if density:
+                return density
+        if self._densities:
+            return float(np.median(list(self._densities.values())))
+        return DEFAULT_EDGE_DENSITY
+
+    def features(self, request, edge_count=None):
+        """Feature vector for a request dict (or PosterRequest)."""
+        data = request if isinstance(request, dict) else request.dict()
+        distance = data.get("distance", 29000)
+        area = area_km2(distance)
+
+        if edge_count is None:
+            edge_count = self.edge_density(data.get("city"), data.get("country")) * area
+        edges_k = edge_count / 1000
+
+        fmt = data.get("format", "png")
+        mpx = data.get("width", 12) * data.get("height", 16) * data.get("dpi", 300) ** 2 / 1e6
+        png_mpx = mpx if fmt in ("png", "both") else 0.0
+        svg_edges_k = edges_k if fmt in ("svg", "both") else 0.0
+
+        area_k = area / 1000
+        return np.array([
+            1.0,
+            edges_k,
+            png_mpx,
+            svg_edges_k,
+            area_k if data.get("show_water", True) else 0.0,
+            area_k if data.get("show_parks", True) else 0.0,
+            area_k if data.get("show_buildings", False) else 0.0,
+            area_k if data.get("show_railways", False) else 0.0,
+        ])
+
+    def _fit(self):
+        """Ridge regression towards the priors: (XᵀX + λI)⁻¹ (Xᵀy + λw₀)."""
+        coefs = {}
+        usable = [s for s in self._samples if s.get("edge_count") is not None]
+        n_features = len(FEATURE_NAMES)
+
+        if usable:
+            X = np.vstack([self.features(s["request"], s["edge_count"]) for s in usable])
+            # Scale columns so the ridge penalty treats features evenly
+            scale = np.maximum(np.abs(X).max(axis=0), 1e-9)
+            Xs = X / scale
+            gram = Xs.T @ Xs + RIDGE_STRENGTH * np.eye(n_features)
+
+        for target in TARGETS:
+            prior = np.array(PRIORS[target])
+            values = [s.get(target) for s in usable]
+            if not usable or any(v is None for v in values):
+                coefs[target] = prior
+                continue
+            y = np.array(values, dtype=float)
+            prior_scaled = prior * scale
+            w = np.linalg.solve(gram, Xs.T @ y + RIDGE_STRENGTH * prior_scaled)
+            coefs[target] = w / scale
+
+        self._coefs = coefs
+
+    def predict(self, request):
+        """Predict duration (s), peak memory (MB) and output size (MB) for a request."""
+        with self._lock:
+            if self._coefs is None:
+                self._fit()
+            x = self.features(request)
+            prediction = {
+                target: round(max(float(x @ self._coefs[target]), 0.0), 2)
+                for target in TARGETS
+            }
+            prediction["samples"] = len(self._samples)
+            return prediction
+
+    def record(self, request, metrics):
+        """
+        Record the metrics of a finished job. `metrics` holds any of
+        duration_seconds, peak_memory_mb, output_size_mb, edge_count and
+        stage_times.
+        """
+        data = request if isinstance(request, dict) else request.dict()
+        sample = {"request": {
+            key: data[key] for key in (
+                "city", "country", "distance", "width", "height", "dpi", "format",
+                "show_water", "show_parks", "show_buildings", "show_railways",
+            ) if key in data
+        }}
+        sample.update(metrics)
+
+        with self._lock:
+            self._add(sample)
+            if self.history_file:
+                os.makedirs(os.path.dirname(os.path.abspath(self.history_file)), exist_ok=True)
+                with open(self.history_file, 'a') as f:
+                    f.write(json.dumps(sample) + "\n")
+
+
+def pack_jobs(estimator, requests, workers=1):
+    """
+    Order and pack requests onto workers, longest predicted job first.
+    Returns a list of per-worker job lists and the predicted makespan.
+    """
+    predicted = sorted(
+        ((estimator.predict(r)["duration_seconds"], r) for r in requests),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+    lanes = [[] for _ in range(max(workers, 1))]
+    loads = [0.0] * len(lanes)
+    for duration, request in predicted:
+        target = loads.index(min(loads))
+        lanes[target].append(request)
+        loads[target] += duration
+    return lanes, max(loads) if loads else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict cost and pack a batch of poster jobs onto workers")
+    parser.add_argument('jobs', help='JSON file with a list of poster requests')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of parallel workers (default: 1)')
+    parser.add_argument('--history', type=str, default=os.path.join("metrics", "job_metrics.jsonl"),
+                        help='Job metrics history file')
+    args = parser.parse_args()
+
+    with open(args.jobs, 'r') as f:
+        batch = json.load(f)
+
+    estimator = JobEstimator(args.history)
+    lanes, makespan = pack_jobs(estimator, batch, args.workers)
+
+    for index, lane in enumerate(lanes, start=1):
+        print(f"Worker {index}:")
+        for request in lane:
+            prediction = estimator.predict(request)
+            print(f"  {request.get('city')}, {request.get('country')} "
+                  f"({request.get('distance', 29000)}m, {request.get('dpi', 300)} DPI): "
+                  f"~{prediction['duration_seconds']:.0f}s, "
+                  f"{prediction['peak_memory_mb']:.0f} MB peak, "
+                  f"{prediction['output_size_mb']:.1f} MB output")
+    print(f"\nPredicted total time: ~{makespan:.0f}s using {len(lanes)} worker(s)")
@@ -0,0 +1,354 @@
+"""
+Load generator for the poster backend.
+
+Each simulated job runs the same flow as the web UI: POST /api/generate,
+poll GET /api/job/{id} until it finishes, then GET /api/download/{id}.
+Cities come from cities.json and output settings from a weighted mix of
+request profiles, so runs are repeatable and comparable across worker-count
+and scheduling changes.
+
+  # Closed loop: 4 users submitting back to back for 5 minutes
+  python loadtest/load_generator.py --users 4 --duration 300
+
+  # Open loop: Poisson arrivals at 0.5 jobs/s, at most 32 in flight
+  python loadtest/load_generator.py --rate 0.5 --duration 600 --max-in-flight 32
+
+  # Every city and profile once, e.g. to seed a recording stub
+  python loadtest/load_generator.py --seed-pass
+
+Reports throughput, latency percentiles per endpoint, end-to-end job times
+and failure rates, and optionally writes them as JSON.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CITIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities.json")
+
+# Request profiles and their default share of the mix. Layers are the same in
+# every profile so one recorded fetch per city serves all of them.
+PROFILES = {
+    "preview": {"weight": 6, "width": 6, "height": 8, "dpi": 150, "format": "png"},
+    "standard": {"weight": 3, "width": 12, "height": 16, "dpi": 300, "format": "png"},
+    "print": {"weight": 1, "width": 18, "height": 24, "dpi": 300, "format": "png"},
+    "vector": {"weight": 0, "width": 12, "height": 16, "dpi": 300, "format": "svg"},
+}
+
+ENDPOINTS = ("generate", "job", "download")
+OUTCOMES = ("completed", "failed", "cancelled", "rejected", "timeout", "error")
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p90": round(percentile(values, 90), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def parse_mix(text):
+    """Parse 'preview=6,standard=3' into profile weights."""
+    weights = {name: profile["weight"] for name, profile in PROFILES.items()}
+    if text:
+        weights = {name: 0 for name in PROFILES}
+        for part in text.split(','):
+            name, _, weight = part.partition('=')
+            if name.strip() not in PROFILES:
+                raise SystemExit(f"Unknown profile '{name}'. Available: {', '.join(PROFILES)}")
+            weights[name.strip()] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def build_request(city, profile_name):
+    profile = PROFILES[profile_name]
+    request = {key: value for key, value in profile.items() if key != "weight"}
+    request.update(city)
+    return request
+
+
+class Recorder:
+    """Thread-safe collection of request latencies and job outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.statuses = {endpoint: {} for endpoint in ENDPOINTS}
+        self.jobs = []
+        self.bytes_downloaded = 0
+
+    def request(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            key = str(status)
+            self.statuses[endpoint][key] = self.statuses[endpoint].get(key, 0) + 1
+
+    def job(self, result):
+        with self._lock:
+            self.jobs.append(result)
+            self.bytes_downloaded += result.get("bytes", 0)
+
+    def report(self, elapsed):
+        with self._lock:
+            jobs = list(self.jobs)
+            endpoints = {}
+            for endpoint in ENDPOINTS:
+                statuses = self.statuses[endpoint]
+                total = sum(statuses.values())
+                failed = sum(count for status, count in statuses.items()
+                             if status == "error" or int(status) >= 400)
+                endpoints[endpoint] = {
+                    "requests": total,
+                    "throughput_rps": round(total / elapsed, 3) if elapsed else 0,
+                    "failure_rate": round(failed / total, 4) if total else 0,
+                    "statuses": dict(statuses),
+                    "latency_seconds": summarize(self.latencies[endpoint]),
+                }
+            bytes_downloaded = self.bytes_downloaded
+
+        outcomes = {outcome: sum(1 for job in jobs if job["outcome"] == outcome) for outcome in OUTCOMES}
+        completed = [job for job in jobs if job["outcome"] == "completed"]
+        by_profile = {}
+        for name in sorted({job["profile"] for job in jobs}):
+            profile_jobs = [job for job in completed if job["profile"] == name]
+            by_profile[name] = {
+                "jobs": sum(1 for job in jobs if job["profile"] == name),
+                "completed": len(profile_jobs),
+                "job_seconds": summarize([job["total_seconds"] for job in profile_jobs]),
+            }
+
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "jobs": len(jobs),
+            "outcomes": outcomes,
+            "failure_rate": round(1 - len(completed) / len(jobs), 4) if jobs else 0,
+            "jobs_per_minute": round(len(completed) / elapsed * 60, 3) if elapsed else 0,
+            "megabytes_downloaded": round(bytes_downloaded / 1024 / 1024, 2),
+            "queue_wait_seconds": summarize([job["queue_seconds"] for job in jobs if "queue_seconds" in job]),
+            "job_seconds": summarize([job["total_seconds"] for job in completed]),
+            "profiles": by_profile,
+            "endpoints": endpoints,
+        }
+
+
+class LoadClient:
+    """Drives one job at a time through the backend API."""
+
+    def __init__(self, base_url, recorder, poll_interval=1.0, job_timeout=900, http_timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.http_timeout = http_timeout
+
+    def _call(self, endpoint, method, path, payload=None, stream=False):
+        """Make one API call. Returns (status, parsed JSON or byte count)."""
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.http_timeout) as response:
+                if stream:
+                    size = 0
+                    for chunk in iter(lambda: response.read(256 * 1024), b''):
+                        size += len(chunk)
+                    body = size
+                else:
+                    body = json.loads(response.read() or b'null')
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status, body = e.code, None
+            e.close()
+        except (urllib.error.URLError, OSError, ValueError):
+            status, body = "error", None
+        self.recorder.request(endpoint, status, time.perf_counter() - start)
+        return status, body
+
+    def run_job(self, request, profile):
+        """Submit, poll and download one poster. Records and returns the job result."""
+        result = {"profile": profile, "city": request["city"]}
+        start = time.perf_counter()
+
+        status, job = self._call("generate", "POST", "/api/generate", request)
+        if status != 200 or not job:
+            result.update(outcome="rejected" if status in (400, 503) else "error", status=status)
+            self.recorder.job(result)
+            return result
+
+        job_id = job["job_id"]
+        result["lane"] = job.get("lane")
+        deadline = start + self.job_timeout
+        state = job.get("status")
+        while state not in ("completed", "failed", "cancelled"):
+            if time.perf_counter() > deadline:
+                result["outcome"] = "timeout"
+                # Give the worker back instead of leaving the job to be reaped
+                self._call("job", "DELETE", f"/api/job/{job_id}")
+                break
+            time.sleep(self.poll_interval)
+            status, job = self._call("job", "GET", f"/api/job/{job_id}")
+            if status != 200 or not job:
+                continue
+            state = job["status"]
+            if state != "queued" and "queue_seconds" not in result:
+                result["queue_seconds"] = time.perf_counter() - start
+        else:
+            if state in ("failed", "cancelled"):
+                result.update(outcome=state, message=job.get("message"))
+            else:
+                status, size = self._call("download", "GET", f"/api/download/{job_id}", stream=True)
+                if status == 200:
+                    result.update(outcome="completed", bytes=size)
+                else:
+                    result.update(outcome="error", status=status)
+
+        result["total_seconds"] = time.perf_counter() - start
+        self.recorder.job(result)
+        return result
+
+
+def closed_loop(client, picker, users, duration, think_time):
+    """`users` clients each submit a new job as soon as their last one finishes."""
+    deadline = time.perf_counter() + duration
+
+    def user_loop():
+        while time.perf_counter() < deadline:
+            client.run_job(*picker())
+            if think_time:
+                time.sleep(random.expovariate(1 / think_time))
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for _ in range(users):
+            pool.submit(user_loop)
+
+
+def open_loop(client, picker, rate, duration, max_in_flight):
+    """Jobs arrive as a Poisson process at `rate` per second, regardless of completions."""
+    deadline = time.perf_counter() + duration
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    dropped = 0
+
+    def run(request, profile):
+        try:
+            client.run_job(request, profile)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while time.perf_counter() < deadline:
+            time.sleep(random.expovariate(rate))
+            if not in_flight.acquire(blocking=False):
+                dropped += 1
+                continue
+            pool.submit(run, *picker())
+    return dropped
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print(f"📊 {report['jobs']} jobs in {report['elapsed_seconds']:.0f}s "
+          f"({report['jobs_per_minute']:.2f} completed/min, {report['megabytes_downloaded']} MB downloaded)")
+    print("   Outcomes: " + ", ".join(f"{k} {v}" for k, v in report["outcomes"].items() if v))
+    print(f"   Job failure rate: {report['failure_rate'] * 100:.1f}%")
+
+    def line(label, stats):
+        if not stats.get("count"):
+            return f"   {label:<18} -"
+        return (f"   {label:<18} n={stats['count']:<5} p50 {stats['p50']:.2f}s  p90 {stats['p90']:.2f}s  "
+                f"p99 {stats['p99']:.2f}s  max {stats['max']:.2f}s")
+
+    print("\n⏱  Jobs (submit to finished)")
+    print(line("all", report["job_seconds"]))
+    print(line("queue wait", report["queue_wait_seconds"]))
+    for name, profile in report["profiles"].items():
+        print(line(name, profile["job_seconds"]))
+
+    print("\n🌐 Endpoints")
+    for endpoint, stats in report["endpoints"].items():
+        print(line(endpoint, stats["latency_seconds"])
+              + f"  {stats['throughput_rps']:.2f} req/s, {stats['failure_rate'] * 100:.1f}% failed")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the poster backend")
+    parser.add_argument('--base-url', default='http://localhost:8000', help='Backend URL')
+    parser.add_argument('--users', type=int, default=2, help='Concurrent users in closed-loop mode')
+    parser.add_argument('--rate', type=float, help='Open-loop arrival rate in jobs per second')
+    parser.add_argument('--max-in-flight', type=int, default=32, help='Open-loop cap on concurrent jobs')
+    parser.add_argument('--duration', type=float, default=300, help='Test duration in seconds')
+    parser.add_argument('--think-time', type=float, default=0, help='Mean pause between a user\'s jobs (s)')
+    parser.add_argument('--mix', help='Profile weights, e.g. preview=6,standard=3,print=1')
+    parser.add_argument('--cities', default=CITIES_FILE, help='JSON list of cities to request')
+    parser.add_argument('--seed-pass', action='store_true',
+                        help='Run every city with every profile in the mix once, sequentially')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between status polls')
+    parser.add_argument('--job-timeout', type=float, default=900, help='Give up on a job after this many seconds')
+    parser.add_argument('--random-seed', type=int, help='Seed for city/profile selection')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+    with open(args.cities, 'r') as f:
+        cities = json.load(f)
+    weights = parse_mix(args.mix)
+    profile_names = list(weights)
+    pick_lock = threading.Lock()
+
+    def pick():
+        with pick_lock:
+            city = random.choice(cities)
+            profile = random.choices(profile_names, weights=[weights[n] for n in profile_names])[0]
+        return build_request(city, profile), profile
+
+    recorder = Recorder()
+    client = LoadClient(args.base_url, recorder, args.poll_interval, args.job_timeout)
+    started = time.perf_counter()
+
+    if args.seed_pass:
+        combos = list(itertools.product(cities, profile_names))
+        print(f"🌱 Seed pass: {len(combos)} jobs against {args.base_url}")
+        for index, (city, profile) in enumerate(combos, start=1):
+            result = client.run_job(build_request(city, profile), profile)
+            print(f"  [{index}/{len(combos)}] {city['city']} ({profile}): {result['outcome']}")
+    elif args.rate:
+        print(f"🚀 Open loop: {args.rate} jobs/s for {args.duration:.0f}s against {args.base_url}")
+        dropped = open_loop(client, pick, args.rate, args.duration, args.max_in_flight)
+        if dropped:
+            print(f"⚠ {dropped} arrivals dropped at the in-flight limit ({args.max_in_flight})")
+    else:
+        print(f"🚀 Closed loop: {args.users} users for {args.duration:.0f}s against {args.base_url}")
+        closed_loop(client, pick, args.users, args.duration, args.think_time)
+
+    report = recorder.report(time.perf_counter() - started)
+    report["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written to {args.output}")
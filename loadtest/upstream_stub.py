@@ -0,0 +1,304 @@
+"""
+Record/replay stand-in for the Nominatim and Overpass APIs.
+
+Serves both upstreams from one local port so the backend can be load tested
+without touching the public services:
+
+  /nominatim/...   geocoding (point NOMINATIM_URL at http://host:port/nominatim)
+  /overpass/...    Overpass API (point OVERPASS_URL at http://host:port/overpass)
+
+In replay mode every request is answered from the recordings directory and
+unknown requests fail with 502. In record mode unknown requests are forwarded
+to the real upstream and the response is saved, so a first pass over the load
+mix seeds the recordings for every later run:
+
+  python loadtest/upstream_stub.py --mode record
+  python loadtest/upstream_stub.py --latency-ms 400 --jitter-ms 200 --error-rate 0.02
+
+Latency and error injection only apply to upstream API calls, never to the
+Overpass /status endpoint, which answers "slots available" so osmnx does not
+pause between requests.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+UPSTREAMS = {
+    "nominatim": "https://nominatim.openstreetmap.org",
+    "overpass": "https://overpass-api.de/api",
+}
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+# Request headers forwarded to the real upstream when recording
+FORWARD_HEADERS = ("User-Agent", "Content-Type", "Accept", "Accept-Language", "Referer")
+
+# Minimum seconds between forwarded requests, per the public services' usage policies
+FORWARD_INTERVAL = {"nominatim": 1.0, "overpass": 1.0}
+
+# Query parameters that change between identical requests and must not affect the key
+VOLATILE_PARAMS = {"email"}
+
+
+def request_key(service, path, query, body):
+    """Stable key for an upstream request: service, path and sorted parameters."""
+    params = sorted(
+        (k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k not in VOLATILE_PARAMS
+    )
+    if body:
+        params += sorted(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+    canonical = json.dumps([service, path, params], ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class Recordings:
+    """Recorded upstream responses, one gzipped JSON file per request."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, service, key):
+        return os.path.join(self.directory, service, f"{key}.json.gz")
+
+    def load(self, service, key):
+        path = self._path(service, key)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, service, key, entry):
+        path = self._path(service, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def count(self):
+        total = {}
+        for service in UPSTREAMS:
+            service_dir = os.path.join(self.directory, service)
+            total[service] = len(os.listdir(service_dir)) if os.path.isdir(service_dir) else 0
+        return total
+
+
+class StubConfig:
+    """Runtime settings shared by all request handler threads."""
+
+    def __init__(self, mode, recordings, latency_ms, jitter_ms, error_rate, error_codes, seed=None):
+        self.mode = mode
+        self.recordings = recordings
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self._next_forward = {service: 0.0 for service in UPSTREAMS}
+        self.stats = {service: {"hits": 0, "recorded": 0, "misses": 0, "injected_errors": 0}
+                      for service in UPSTREAMS}
+
+    def count(self, service, field):
+        with self.lock:
+            self.stats[service][field] += 1
+
+    def draw_delay(self, service):
+        """Injected latency in seconds for one request."""
+        latency = self.latency_ms.get(service, 0)
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(latency + jitter, 0) / 1000
+
+    def wait_to_forward(self, service):
+        """Space out requests to the real upstream while recording."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self._next_forward[service])
+            self._next_forward[service] = slot + FORWARD_INTERVAL[service]
+        time.sleep(slot - now)
+
+    def draw_error(self):
+        """Status code to fail this request with, or None."""
+        with self.lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.random.choice(self.error_codes)
+        return None
+
+
+def overpass_status():
+    """Overpass /status body reporting free slots, in the format osmnx parses."""
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return (
+        "Connected as: 0\n"
+        f"Current time: {now}\n"
+        "Announced endpoint: none\n"
+        "Rate limit: 0\n"
+        "2 slots available now.\n"
+        "Currently running queries (pid, space limit, time limit, start time):\n"
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "UpstreamStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._handle(self.rfile.read(length) if length else b"")
+
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, body):
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            stats = {"mode": self.config.mode, "services": self.config.stats,
+                     "recordings": self.config.recordings.count()}
+            self._send(200, json.dumps(stats, indent=2))
+            return
+
+        service, _, path = url.path.lstrip("/").partition("/")
+        path = "/" + path
+        if service not in UPSTREAMS:
+            self._send(404, json.dumps({"error": f"Unknown upstream '{service}'"}))
+            return
+
+        if service == "overpass" and path.rstrip("/") == "/status":
+            self._send(200, overpass_status(), "text/plain")
+            return
+
+        time.sleep(self.config.draw_delay(service))
+        error_status = self.config.draw_error()
+        if error_status:
+            self.config.count(service, "injected_errors")
+            self._send(error_status, json.dumps({"error": "Injected upstream error"}))
+            return
+
+        key = request_key(service, path, url.query, body)
+        entry = self.config.recordings.load(service, key)
+        if entry is not None:
+            self.config.count(service, "hits")
+        elif self.config.mode == "record":
+            entry = self._forward(service, path, url.query, body)
+            if entry is None:
+                return
+            if entry["status"] == 200:
+                self.config.recordings.save(service, key, entry)
+                self.config.count(service, "recorded")
+        else:
+            self.config.count(service, "misses")
+            self._send(502, json.dumps({
+                "error": f"No recording for {self.command} /{service}{path}",
+                "key": key,
+            }))
+            return
+
+        self._send(entry["status"], entry["body"], entry["content_type"])
+
+    def _forward(self, service, path, query, body):
+        """Fetch a request from the real upstream. Returns a recording entry."""
+        upstream = self.server.upstreams[service].rstrip("/") + path
+        if query:
+            upstream += "?" + query
+        headers = {name: self.headers[name] for name in FORWARD_HEADERS if self.headers.get(name)}
+        forwarded = urllib.request.Request(upstream, data=body or None, headers=headers, method=self.command)
+        self.config.wait_to_forward(service)
+
+        try:
+            with urllib.request.urlopen(forwarded, timeout=self.server.upstream_timeout) as response:
+                status, content_type, payload = response.status, response.headers.get_content_type(), response.read()
+        except urllib.error.HTTPError as e:
+            status, content_type, payload = e.code, e.headers.get_content_type(), e.read()
+        except (urllib.error.URLError, TimeoutError) as e:
+            self._send(502, json.dumps({"error": f"Upstream request failed: {e}"}))
+            return None
+
+        return {
+            "request": {"method": self.command, "path": path, "query": query,
+                        "body": body.decode('utf-8')},
+            "status": status,
+            "content_type": content_type,
+            "body": payload.decode('utf-8'),
+        }
+
+
+def make_server(host, port, config, upstreams=None, upstream_timeout=180, quiet=True):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config
+    server.upstreams = dict(UPSTREAMS, **(upstreams or {}))
+    server.upstream_timeout = upstream_timeout
+    server.quiet = quiet
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the Nominatim and Overpass APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--mode', choices=['replay', 'record'], default='replay',
+                        help='replay: serve recordings only; record: forward and save unknown requests')
+    parser.add_argument('--recordings', default=RECORDINGS_DIR, help='Recordings directory')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added latency for every upstream call')
+    parser.add_argument('--nominatim-latency-ms', type=float, help='Override --latency-ms for Nominatim')
+    parser.add_argument('--overpass-latency-ms', type=float, help='Override --latency-ms for Overpass')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Uniform +/- jitter added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with an error')
+    parser.add_argument('--error-codes', default='429,504,500', help='Comma-separated status codes to inject')
+    parser.add_argument('--nominatim-upstream', default=UPSTREAMS['nominatim'])
+    parser.add_argument('--overpass-upstream', default=UPSTREAMS['overpass'])
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible latency and errors')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    latency = {
+        "nominatim": args.nominatim_latency_ms if args.nominatim_latency_ms is not None else args.latency_ms,
+        "overpass": args.overpass_latency_ms if args.overpass_latency_ms is not None else args.latency_ms,
+    }
+    error_codes = [int(code) for code in args.error_codes.split(',') if code.strip()]
+    config = StubConfig(args.mode, Recordings(args.recordings), latency, args.jitter_ms,
+                        args.error_rate, error_codes, seed=args.seed)
+    server = make_server(args.host, args.port, config,
+                         upstreams={"nominatim": args.nominatim_upstream, "overpass": args.overpass_upstream},
+                         quiet=not args.verbose)
+
+    counts = config.recordings.count()
+    print(f"🛰  Upstream stub ({args.mode}) on http://{args.host}:{args.port}")
+    print(f"   Recordings: {counts['nominatim']} Nominatim, {counts['overpass']} Overpass in {args.recordings}")
+    print(f"   NOMINATIM_URL=http://{args.host}:{args.port}/nominatim")
+    print(f"   OVERPASS_URL=http://{args.host}:{args.port}/overpass")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(config.stats, indent=2))
@@ -0,0 +1,418 @@
+"""
+Poster renderers.
+
+A poster only needs a handful of drawing primitives: filled polygons, stroked
+polylines, a linear alpha gradient, a few text strings and one rule line. The
+drawing code in create_map_poster.py and backend/render_worker.py issues those
+through a renderer, so the rasteriser can be swapped:
+
+  matplotlib  MatplotlibRenderer, the reference implementation (PNG and SVG)
+  raster      RasterRenderer, draws straight into an Agg pixel buffer (PNG only)
+
+Map geometry is given in map coordinates and prepared once as NumPy arrays
+(prepare_polygons, prepare_lines); the renderer frames it to `view`, a
+(west, south, east, north) box that fills the whole poster. Text and the rule
+line are placed in poster fractions from the bottom left, like matplotlib's
+transAxes. As in matplotlib, draws are stacked by zorder, ties in call order.
+
+Like the rest of the poster code, heavy modules are imported where used.
+"""
+from abc import ABC, abstractmethod
+
+RENDERERS = ("matplotlib", "raster")
+
+# The gradient fade is an image of this many rows stretched over a quarter of
+# the poster; the raster renderer reproduces the same steps
+GRADIENT_LEVELS = 256
+GRADIENT_HEIGHT = 0.25
+
+
+class PolygonSet:
+    """
+    Polygons as flat arrays: `vertices` (N, 2) and `ring_starts`, the index
+    of the first vertex of every ring. Each polygon's exterior comes first
+    and runs counter-clockwise, its holes run clockwise.
+    """
+
+    def __init__(self, vertices, ring_starts):
+        self.vertices = vertices
+        self.ring_starts = ring_starts
+
+
+def prepare_polygons(geometries):
+    """
+    Polygon parts of a geometry array as a PolygonSet, or None if there are
+    none. Built from shapely's vectorized coordinate arrays, so no Python loop
+    runs per polygon. Points and lines are ignored.
+    """
+    import numpy as np
+    import shapely
+    geoms = np.asarray(geometries, dtype=object)
+    geoms = geoms[shapely.get_type_id(geoms) >= 0]  # Drop missing geometries
+
+    # Explode multi-part geometries and keep only polygons (type id 3)
+    polys = shapely.get_parts(geoms)
+    polys = polys[shapely.get_type_id(polys) == 3]
+    if len(polys) == 0:
+        return None
+
+    # Exteriors counter-clockwise, holes clockwise, so the nonzero fill rule
+    # leaves holes empty even when everything is drawn as one path
+    polys = shapely.orient_polygons(polys)
+
+    rings = shapely.get_rings(polys)
+    vertices, ring_index = shapely.get_coordinates(rings, return_index=True)
+    ring_starts = np.flatnonzero(np.concatenate(([True], ring_index[1:] != ring_index[:-1])))
+    return PolygonSet(vertices, ring_starts)
+
+
+def prepare_lines(geometries):
+    """Line parts of a geometry array as a list of (k, 2) vertex arrays, one per line."""
+    import numpy as np
+    import shapely
+    geoms = np.asarray(geometries, dtype=object)
+    geoms = geoms[shapely.get_type_id(geoms) >= 0]
+    lines = shapely.get_parts(geoms)
+    lines = lines[shapely.get_type_id(lines) == 1]  # LineStrings only
+    if len(lines) == 0:
+        return []
+    vertices, line_index = shapely.get_coordinates(lines, return_index=True)
+    splits = np.flatnonzero(np.diff(line_index)) + 1
+    return np.split(vertices, splits)
+
+
+def polygon_path(polygons):
+    """A PolygonSet as one matplotlib Path, every ring its own closed subpath."""
+    import numpy as np
+    from matplotlib.path import Path
+    starts = np.zeros(len(polygons.vertices), dtype=bool)
+    starts[polygons.ring_starts] = True
+    ends = np.roll(starts, -1)
+    codes = np.full(len(polygons.vertices), Path.LINETO, dtype=Path.code_type)
+    codes[starts] = Path.MOVETO
+    codes[ends] = Path.CLOSEPOLY
+    return Path(polygons.vertices, codes)
+
+
+class PosterRenderer(ABC):
+    """
+    Interface shared by all renderers. A renderer draws one poster of
+    width x height inches at `dpi`, with the map framed to `view`.
+    `background` is a color, or None for a transparent canvas where the
+    renderer supports it.
+    """
+
+    formats = ("png",)
+    # True if the output DPI may still be changed after drawing (before save)
+    dpi_at_save = False
+
+    def __init__(self, width, height, dpi, view, background):
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.view = view
+        self.background = background
+
+    @abstractmethod
+    def fill_polygons(self, polygons, color, zorder, alpha=1.0):
+        """Fill a PolygonSet."""
+
+    @abstractmethod
+    def stroke_lines(self, lines, colors, widths, zorder):
+        """Stroke polylines; `colors` and `widths` (in points) give one value per line."""
+
+    @abstractmethod
+    def gradient(self, color, location, zorder):
+        """Fade `color` in over the bottom or top quarter of the poster, opaque at the edge."""
+
+    @abstractmethod
+    def text(self, x, y, text, font, color, zorder, alpha=1.0, ha='center', va='baseline'):
+        """Draw text at poster fractions (x, y) with a matplotlib FontProperties."""
+
+    @abstractmethod
+    def rule(self, x0, x1, y, color, width, zorder):
+        """Horizontal line from x0 to x1 at height y (poster fractions), `width` in points."""
+
+    @abstractmethod
+    def save(self, path, fmt='png'):
+        """Write the poster to `path` in `fmt`, one of `formats`."""
+
+    @abstractmethod
+    def rgba(self):
+        """Rasterise and return the straight-alpha RGBA pixels as a (height, width, 4) uint8 array."""
+
+    def save_with_pixels(self, path):
+        """
+        Rasterise once, save the PNG and return its pixels (see rgba), for
+        callers that derive more outputs from the same image.
+        """
+        from PIL import Image
+        pixels = self.rgba()
+        image = Image.fromarray(pixels)
+        if self.background is not None:
+            image = image.convert("RGB")  # Opaque anyway, and a quarter smaller to encode
+        image.save(path, format='PNG', dpi=(self.dpi, self.dpi))
+        return pixels
+
+    def close(self):
+        pass
+
+
+class MatplotlibRenderer(PosterRenderer):
+    """Reference renderer: one matplotlib figure with a single full-size axes."""
+
+    formats = ("png", "svg")
+    dpi_at_save = True
+
+    def __init__(self, width, height, dpi, view, background):
+        super().__init__(width, height, dpi, view, background)
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_axes([0, 0, 1, 1])
+        if background is None:
+            self.fig.patch.set_alpha(0)
+            self.ax.set_facecolor('none')
+        else:
+            self.fig.patch.set_facecolor(background)
+            self.ax.set_facecolor(background)
+        self._frame()
+
+    def _frame(self):
+        """The view fills the whole figure; nothing drawn may rescale it."""
+        west, south, east, north = self.view
+        self.ax.set_xlim(west, east)
+        self.ax.set_ylim(south, north)
+        self.ax.set_aspect('auto')
+        self.ax.set_autoscale_on(False)
+        self.ax.axis('off')
+
+    def fill_polygons(self, polygons, color, zorder, alpha=1.0):
+        from matplotlib.collections import PathCollection
+        # One artist for the whole layer instead of one patch per polygon
+        collection = PathCollection(
+            [polygon_path(polygons)], facecolors=color, edgecolors='none',
+            linewidths=0, alpha=alpha, zorder=zorder
+        )
+        # autolim=False: computing limits from a huge path is slow and the view is fixed
+        self.ax.add_collection(collection, autolim=False)
+
+    def stroke_lines(self, lines, colors, widths, zorder):
+        from matplotlib.collections import LineCollection
+        self.ax.add_collection(
+            LineCollection(lines, colors=colors, linewidths=widths, zorder=zorder),
+            autolim=False
+        )
+
+    def gradient(self, color, location, zorder):
+        import numpy as np
+        import matplotlib.colors as mcolors
+        vals = np.linspace(0, 1, GRADIENT_LEVELS).reshape(-1, 1)
+        gradient = np.hstack((vals, vals))
+
+        my_colors = np.zeros((GRADIENT_LEVELS, 4))
+        my_colors[:, :3] = mcolors.to_rgb(color)
+        if location == 'bottom':
+            my_colors[:, 3] = np.linspace(1, 0, GRADIENT_LEVELS)
+            extent_y_start, extent_y_end = 0, GRADIENT_HEIGHT
+        else:
+            my_colors[:, 3] = np.linspace(0, 1, GRADIENT_LEVELS)
+            extent_y_start, extent_y_end = 1 - GRADIENT_HEIGHT, 1.0
+
+        west, south, east, north = self.view
+        y_range = north - south
+        self.ax.imshow(gradient, extent=[west, east, south + y_range * extent_y_start, south + y_range * extent_y_end],
+                       aspect='auto', cmap=mcolors.ListedColormap(my_colors), zorder=zorder, origin='lower')
+
+    def text(self, x, y, text, font, color, zorder, alpha=1.0, ha='center', va='baseline'):
+        self.ax.text(x, y, text, transform=self.ax.transAxes, color=color, alpha=alpha,
+                     ha=ha, va=va, fontproperties=font, zorder=zorder)
+
+    def rule(self, x0, x1, y, color, width, zorder):
+        self.ax.plot([x0, x1], [y, y], transform=self.ax.transAxes, color=color, linewidth=width, zorder=zorder)
+
+    def save(self, path, fmt='png'):
+        import matplotlib
+        self._frame()
+        # Vector output keeps pyplot's default figure DPI for embedded images such as the gradient
+        dpi = self.dpi if fmt == 'png' else matplotlib.rcParams['figure.dpi']
+        self.fig.savefig(path, dpi=dpi, facecolor=self.fig.get_facecolor(), format=fmt)
+
+    def rgba(self):
+        """Rasterise and return the straight-alpha RGBA pixels as a (height, width, 4) uint8 array."""
+        import numpy as np
+        self._frame()
+        self.fig.set_dpi(self.dpi)  # The DPI may have been lowered since the figure was created
+        self.canvas.draw()
+        return np.array(self.canvas.buffer_rgba())
+
+    def close(self):
+        self.fig.clear()
+
+
+class RasterRenderer(PosterRenderer):
+    """
+    Draws straight into an Agg pixel buffer, without a figure or artists.
+
+    This is the rasteriser matplotlib itself uses, so output matches the
+    reference closely, but each draw call hands Agg one compound path and
+    one transform: no Path object, color conversion or transform per line.
+    Lines sharing a color and width are stroked together, so where lines of
+    different styles cross, the stacking can differ from the reference. Draw
+    calls are queued and painted in zorder on save.
+    """
+
+    def __init__(self, width, height, dpi, view, background):
+        super().__init__(width, height, dpi, view, background)
+        from matplotlib.backends.backend_agg import RendererAgg
+        from matplotlib.transforms import Affine2D
+
+        self.size = (int(round(width * dpi)), int(round(height * dpi)))
+        self.renderer = RendererAgg(self.size[0], self.size[1], dpi)
+        west, south, east, north = view
+        # Map coordinates to output pixels, origin at the bottom left
+        self.map_transform = Affine2D().translate(-west, -south).scale(
+            self.size[0] / (east - west), self.size[1] / (north - south))
+        self._ops = []  # (zorder, sequence, paint callable)
+
+    def _gc(self, color, alpha=1.0, linewidth=0):
+        import matplotlib.colors as mcolors
+        gc = self.renderer.new_gc()
+        gc.set_foreground(mcolors.to_rgb(color))
+        gc.set_alpha(alpha)
+        gc.set_linewidth(linewidth)
+        return gc
+
+    def _queue(self, zorder, paint):
+        self._ops.append((zorder, len(self._ops), paint))
+
+    def fill_polygons(self, polygons, color, zorder, alpha=1.0):
+        self._queue(zorder, lambda: self._paint_polygons(polygons, color, alpha))
+
+    def _paint_polygons(self, polygons, color, alpha):
+        import matplotlib.colors as mcolors
+        gc = self._gc(color, alpha)
+        self.renderer.draw_path(gc, polygon_path(polygons), self.map_transform, mcolors.to_rgb(color))
+        gc.restore()
+
+    def stroke_lines(self, lines, colors, widths, zorder):
+        self._queue(zorder, lambda: self._paint_lines(lines, colors, widths))
+
+    def _paint_lines(self, lines, colors, widths):
+        import numpy as np
+        from matplotlib.path import Path
+        if not len(lines):
+            return
+        styles = {}
+        for index, style in enumerate(zip(colors, widths)):
+            styles.setdefault(style, []).append(index)
+
+        for (color, width), indices in styles.items():
+            style_lines = [lines[i] for i in indices]
+            vertices = np.concatenate(style_lines)
+            codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+            codes[np.cumsum([0] + [len(line) for line in style_lines[:-1]])] = Path.MOVETO
+            gc = self._gc(color, linewidth=width)
+            self.renderer.draw_path(gc, Path(vertices, codes), self.map_transform, None)
+            gc.restore()
+
+    def gradient(self, color, location, zorder):
+        self._queue(zorder, lambda: self._paint_gradient(color, location))
+
+    def _paint_gradient(self, color, location):
+        import numpy as np
+        import matplotlib.colors as mcolors
+        width_px, height_px = self.size
+        rows = int(round(height_px * GRADIENT_HEIGHT))
+        if rows == 0:
+            return
+        # The same steps as the stretched gradient image in MatplotlibRenderer;
+        # like there, row 0 is the bottom of the band
+        t = (np.arange(rows) + 0.5) / rows
+        level = np.minimum((t * GRADIENT_LEVELS).astype(int), GRADIENT_LEVELS - 1)
+        alpha = level / (GRADIENT_LEVELS - 1)
+        if location == 'bottom':
+            alpha = 1 - alpha
+            y = 0
+        else:
+            y = height_px - rows
+        image = np.empty((rows, width_px, 4), dtype=np.uint8)
+        image[:, :, :3] = [int(round(c * 255)) for c in mcolors.to_rgb(color)]
+        image[:, :, 3] = np.round(alpha * 255).astype(np.uint8)[:, None]
+        gc = self.renderer.new_gc()
+        self.renderer.draw_image(gc, 0, y, image)
+        gc.restore()
+
+    def text(self, x, y, text, font, color, zorder, alpha=1.0, ha='center', va='baseline'):
+        self._queue(zorder, lambda: self._paint_text(x, y, text, font, color, alpha, ha, va))
+
+    def _paint_text(self, x, y, text, font, color, alpha, ha, va):
+        width_px, height_px = self.size
+        # Single-line layout as in matplotlib's Text: the line box is at
+        # least as tall as "lp" so alignment does not depend on the letters
+        width, height, descent = self.renderer.get_text_width_height_descent(text, font, ismath=False)
+        _, lp_height, lp_descent = self.renderer.get_text_width_height_descent("lp", font, ismath=False)
+        height, descent = max(height, lp_height), max(descent, lp_descent)
+        left = x * width_px - {'left': 0, 'center': width / 2, 'right': width}[ha]
+        baseline = y * height_px + {'baseline': 0, 'bottom': descent, 'center': descent - height / 2,
+                                    'top': descent - height}[va]
+        gc = self._gc(color, alpha)
+        # Agg text is placed from the top, like matplotlib's Text.draw does for it
+        self.renderer.draw_text(gc, left, height_px - baseline, text, font, 0)
+        gc.restore()
+
+    def rule(self, x0, x1, y, color, width, zorder):
+        self._queue(zorder, lambda: self._paint_rule(x0, x1, y, color, width))
+
+    def _paint_rule(self, x0, x1, y, color, width):
+        from matplotlib.path import Path
+        from matplotlib.transforms import Affine2D
+        gc = self._gc(color, linewidth=width)
+        gc.set_capstyle('projecting')  # Line2D's default, as drawn by MatplotlibRenderer
+        self.renderer.draw_path(gc, Path([(x0, y), (x1, y)]), Affine2D().scale(*self.size), None)
+        gc.restore()
+
+    def paint(self):
+        """Paint the background and every queued draw call in zorder."""
+        import matplotlib.colors as mcolors
+        from matplotlib.path import Path
+        from matplotlib.transforms import Affine2D
+        if self.background is not None:
+            gc = self._gc(self.background)
+            self.renderer.draw_path(gc, Path.unit_rectangle(), Affine2D().scale(*self.size),
+                                    mcolors.to_rgb(self.background))
+            gc.restore()
+        for _, _, paint in sorted(self._ops, key=lambda op: op[:2]):
+            paint()
+        self._ops = []
+
+    def save(self, path, fmt='png'):
+        from PIL import Image
+        if fmt not in self.formats:
+            raise ValueError(f"The raster renderer cannot write {fmt.upper()}")
+        self.paint()
+        image = Image.frombuffer("RGBA", self.size, self.renderer.buffer_rgba(), "raw", "RGBA", 0, 1)
+        if self.background is not None:
+            image = image.convert("RGB")  # Opaque anyway, and a quarter smaller to encode
+        image.save(path, format='PNG', dpi=(self.dpi, self.dpi))
+
+    def rgba(self):
+        """Paint and return the straight-alpha RGBA pixels as a (height, width, 4) uint8 array."""
+        import numpy as np
+        self.paint()
+        return np.array(self.renderer.buffer_rgba())
+
+    def close(self):
+        self._ops = []
+        self.renderer = None
+
+
+def create_renderer(name, width, height, dpi, view, background):
+    """Renderer by name, see RENDERERS."""
+    if name == "matplotlib":
+        return MatplotlibRenderer(width, height, dpi, view, background)
+    if name == "raster":
+        return RasterRenderer(width, height, dpi, view, background)
+    raise ValueError(f"Unknown renderer '{name}', choose from: {', '.join(RENDERERS)}")
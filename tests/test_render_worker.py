@@ -0,0 +1,51 @@
+"""
+Layer processes of a layered render run under their share of the job's memory
+budget (see render_worker._forked_budget_mb).
+"""
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)  # Themes and fonts are looked up relative to the repository
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "backend"))
+
+import create_map_poster as cmp  # noqa: E402
+import render_worker  # noqa: E402
+from memory import MemoryBudgetExceeded  # noqa: E402
+from models import PosterRequest  # noqa: E402
+
+pytestmark = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(),
+                                reason="layer processes are forked")
+
+
+def _rasterize_overlay(budget_mb):
+    """Rasterise the text overlay in a forked layer process with `budget_mb`. Returns its result."""
+    cmp.THEME = cmp.load_theme("feature_based")
+    point = (48.8566, 2.3522)
+    render_worker._layer_context.update(
+        request=PosterRequest(city="Paris", country="France", width=12, height=16, dpi=150),
+        coords=point, data={}, view=cmp.map_bbox(point, 4000),
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=render_worker._init_forked_process, initargs=(budget_mb,)) as pool:
+            return pool.submit(render_worker._rasterize_layer, "overlay").result()
+    finally:
+        render_worker._layer_context.clear()
+
+
+def test_layer_process_reports_its_peak():
+    pixels, peak_mb = _rasterize_overlay(None)
+    assert pixels.shape == (16 * 150, 12 * 150, 4)
+    assert peak_mb > 0
+
+
+def test_layer_process_enforces_its_budget():
+    # Well below the resident size of any Python process with matplotlib loaded
+    with pytest.raises(MemoryBudgetExceeded):
+        _rasterize_overlay(1)
@@ -0,0 +1,31 @@
+"""
+The raster renderer must match the matplotlib reference on the synthetic map
+of tools/compare_renderers.py, within the same tolerances the tool gates on.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import compare_renderers as cr  # noqa: E402  (changes into the repository root for themes and fonts)
+from compare_renderers import cmp  # noqa: E402
+
+MAX_MEAN = 0.5
+MAX_OVER_32_PERCENT = 0.5
+
+
+def test_raster_matches_matplotlib_on_synthetic_map(tmp_path):
+    cmp.THEME = cmp.load_theme("feature_based")
+    args = SimpleNamespace(width=12, height=16, dpi=150, city=None, country=None)
+    point = (48.8566, 2.3522)
+    view = cmp.map_bbox(point, 4000)
+    geometry = cr.synthetic_map(1, view)
+
+    files = {name: str(tmp_path / f"{name}.png") for name in ("matplotlib", "raster")}
+    for name, path in files.items():
+        cr.render(name, args, lambda renderer: cr.draw_synthetic(renderer, geometry), view, point, path)
+    stats = cr.compare(files["matplotlib"], files["raster"], str(tmp_path / "diff.png"))
+
+    assert stats["mean"] <= MAX_MEAN, stats
+    assert stats["over_32_percent"] <= MAX_OVER_32_PERCENT, stats
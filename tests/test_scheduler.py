@@ -0,0 +1,24 @@
+"""
+Lane classification of the scheduler's cost estimates (see backend/scheduler.py).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from models import PosterRequest  # noqa: E402
+from scheduler import JobScheduler, estimate_job_cost  # noqa: E402
+
+
+def _lane(**fields):
+    return JobScheduler(runner=None).classify(estimate_job_cost(PosterRequest(city="Paris", country="France", **fields)))
+
+
+def test_default_request_is_interactive():
+    assert _lane() == "interactive"
+    assert _lane(dpi=600) == "interactive"
+
+
+def test_large_requests_are_heavy():
+    assert _lane(show_buildings=True) == "heavy"
+    assert _lane(distance=50000) == "heavy"
@@ -0,0 +1,192 @@
+"""
+Pixel comparison of the raster renderer against the matplotlib reference.
+
+Draws the same poster with both renderers (see renderers.py), reports how far
+the raster output strays from the reference and how long each took, and
+writes both PNGs plus an amplified difference image. Exits with status 1 if
+the difference is over the tolerances, so it can gate renderer changes:
+
+  python tools/compare_renderers.py                          # synthetic map, no network
+  python tools/compare_renderers.py --theme noir --dpi 150
+  python tools/compare_renderers.py --city Venice --country Italy --distance 4000
+
+The synthetic map has water with islands, overlapping parks, translucent
+buildings, a hierarchy of roads and railways, so every drawing primitive is
+covered without touching Nominatim or Overpass.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIR)  # Themes and fonts are looked up relative to the repository
+sys.path.insert(0, ROOT_DIR)
+
+import create_map_poster as cmp  # noqa: E402
+from renderers import create_renderer, prepare_lines, prepare_polygons  # noqa: E402
+
+# Road classes of the synthetic map: theme color key and line width in points
+ROAD_CLASSES = [
+    ('road_motorway', 1.2),
+    ('road_primary', 1.0),
+    ('road_secondary', 0.8),
+    ('road_tertiary', 0.6),
+    ('road_residential', 0.4),
+    ('road_default', 0.4),
+]
+
+
+def synthetic_map(seed, view):
+    """Shapely geometry for a made-up city inside view. Returns {layer: geometries}."""
+    import shapely
+    from shapely.geometry import LineString, Polygon
+
+    rng = random.Random(seed)
+    west, south, east, north = view
+    width, height = east - west, north - south
+
+    def point(fx, fy):
+        return (west + fx * width, south + fy * height)
+
+    def blob(cx, cy, radius, vertices=24):
+        return Polygon([
+            point(cx + radius * rng.uniform(0.7, 1.0) * math.cos(2 * math.pi * i / vertices),
+                  cy + radius * rng.uniform(0.7, 1.0) * math.sin(2 * math.pi * i / vertices))
+            for i in range(vertices)
+        ])
+
+    # A lake with islands, and a river
+    lake = blob(0.3, 0.6, 0.18, vertices=64)
+    islands = [blob(0.27, 0.62, 0.04), blob(0.35, 0.55, 0.03)]
+    lake = shapely.difference(lake, shapely.union_all(islands))
+    river = LineString([point(0, 0.3), point(0.4, 0.35), point(0.7, 0.25), point(1, 0.32)]).buffer(0.015 * width)
+    water = [lake, river]
+
+    parks = [blob(rng.uniform(0.05, 0.95), rng.uniform(0.05, 0.95), rng.uniform(0.01, 0.06)) for _ in range(60)]
+    parks.append(islands[0])  # A park that fills an island exactly
+
+    buildings = []
+    for _ in range(1500):
+        fx, fy = rng.uniform(0.5, 0.95), rng.uniform(0.4, 0.9)
+        size_x, size_y = rng.uniform(0.002, 0.008), rng.uniform(0.002, 0.008)
+        buildings.append(Polygon([point(fx, fy), point(fx + size_x, fy), point(fx + size_x, fy + size_y),
+                                  point(fx, fy + size_y)]))
+
+    # Street grid: wobbly lines, every few a major road, plus diagonal avenues
+    roads = []
+    for i in range(1, 60):
+        f = i / 60
+        road_class = 0 if i % 20 == 0 else 1 if i % 10 == 0 else 2 if i % 5 == 0 else rng.choice([3, 4, 4, 5])
+        wobble = [rng.uniform(-0.003, 0.003) for _ in range(12)]
+        roads.append((LineString([point(f + wobble[k], k / 11) for k in range(12)]), road_class))
+        roads.append((LineString([point(k / 11, f + wobble[k]) for k in range(12)]), road_class))
+    for _ in range(8):
+        roads.append((LineString([point(rng.random(), 0), point(rng.random(), 1)]), rng.choice([0, 1, 2])))
+
+    railways = [LineString([point(0, rng.uniform(0.1, 0.9)), point(0.5, rng.uniform(0.1, 0.9)),
+                            point(1, rng.uniform(0.1, 0.9))]) for _ in range(3)]
+
+    return {"water": water, "parks": parks, "buildings": buildings, "roads": roads, "railways": railways}
+
+
+def draw_synthetic(renderer, geometry):
+    """Draw the synthetic map with the same layers and stacking as cmp.draw_map."""
+    theme = cmp.THEME
+    renderer.fill_polygons(prepare_polygons(geometry["water"]), theme['water'], zorder=1)
+
+    lines = prepare_lines([line for line, _ in geometry["roads"]])
+    classes = [ROAD_CLASSES[road_class] for _, road_class in geometry["roads"]]
+    renderer.stroke_lines(lines, [theme[key] for key, _ in classes], [width for _, width in classes], zorder=1)
+
+    renderer.fill_polygons(prepare_polygons(geometry["parks"]), theme['parks'], zorder=2)
+    renderer.fill_polygons(prepare_polygons(geometry["buildings"]), theme.get('building', '#D0D0D0'),
+                           zorder=2.5, alpha=0.5)
+    rails = prepare_lines(geometry["railways"])
+    renderer.stroke_lines(rails, [theme.get('railway', '#888888')] * len(rails), [0.5] * len(rails), zorder=2.7)
+
+
+def render(name, args, draw, view, point, output_file):
+    """Draw and save one poster. Returns the seconds it took."""
+    start = time.perf_counter()
+    renderer = create_renderer(name, args.width, args.height, args.dpi, view, cmp.THEME['bg'])
+    draw(renderer)
+    cmp.draw_poster_text(renderer, args.city or "Synthetic", args.country or "Renderer Check", point)
+    renderer.save(output_file, 'png')
+    renderer.close()
+    return time.perf_counter() - start
+
+
+def compare(reference_file, candidate_file, diff_file):
+    """Difference statistics between two PNGs of the same size, in 0-255 channel units."""
+    import numpy as np
+    from PIL import Image
+
+    reference = np.asarray(Image.open(reference_file).convert("RGB"), dtype=np.int16)
+    candidate = np.asarray(Image.open(candidate_file).convert("RGB"), dtype=np.int16)
+    if reference.shape != candidate.shape:
+        raise SystemExit(f"Image sizes differ: {reference.shape} vs {candidate.shape}")
+
+    diff = np.abs(reference - candidate).max(axis=2)
+    Image.fromarray(np.minimum(diff * 8, 255).astype(np.uint8)).save(diff_file)
+    return {
+        "mean": round(float(diff.mean()), 3),
+        "p99": int(np.percentile(diff, 99)),
+        "max": int(diff.max()),
+        "over_32_percent": round(float((diff > 32).mean() * 100), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the raster renderer against the matplotlib reference")
+    parser.add_argument('--theme', '-t', default='feature_based')
+    parser.add_argument('--width', type=float, default=12)
+    parser.add_argument('--height', type=float, default=16)
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--city', '-c', help='Compare on real map data (needs network access or a warm cache)')
+    parser.add_argument('--country', '-C')
+    parser.add_argument('--distance', '-d', type=int, default=4000)
+    parser.add_argument('--layers', default='water,parks', help='Feature layers to fetch for --city')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic map')
+    parser.add_argument('--output-dir', default=os.path.join('posters', 'renderer_check'))
+    # Both renderers rasterise with Agg; what differs is mostly where roads of
+    # different classes cross, as the raster renderer strokes each class at once
+    parser.add_argument('--max-mean', type=float, default=0.5, help='Largest allowed mean channel difference')
+    parser.add_argument('--max-over-32', type=float, default=0.5,
+                        help='Largest allowed percentage of pixels off by more than 32')
+    args = parser.parse_args()
+
+    cmp.THEME = cmp.load_theme(args.theme)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.city:
+        if not args.country:
+            parser.error("--city needs --country")
+        cmp.configure_upstreams()
+        point = cmp.get_coordinates(args.city, args.country)
+        view = cmp.map_bbox(point, args.distance)
+        layers = [layer for layer in args.layers.split(',') if layer]
+        G, features = cmp.fetch_chunk(view, layers)
+
+        def draw(renderer):
+            cmp.draw_map(renderer, G, **features)
+    else:
+        point = (48.8566, 2.3522)
+        view = cmp.map_bbox(point, args.distance)
+        geometry = synthetic_map(args.seed, view)
+
+        def draw(renderer):
+            draw_synthetic(renderer, geometry)
+
+    files = {name: os.path.join(args.output_dir, f"{name}.png") for name in ("matplotlib", "raster")}
+    timings = {name: round(render(name, args, draw, view, point, path), 3) for name, path in files.items()}
+    stats = compare(files["matplotlib"], files["raster"], os.path.join(args.output_dir, "diff.png"))
+
+    passed = stats["mean"] <= args.max_mean and stats["over_32_percent"] <= args.max_over_32
+    print(json.dumps({"seconds": timings, "difference": stats, "passed": passed}, indent=2))
+    print(f"{'✓' if passed else '✗'} Raster renderer {'matches' if passed else 'differs from'} the reference "
+          f"(outputs in {args.output_dir})")
+    sys.exit(0 if passed else 1)